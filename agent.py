@@ -34,6 +34,7 @@ except ImportError:
 from checks.check_status import CollectorStatus
 from checks.collector import Collector
 from config import (
+    clear_service_disco_configs,
     get_config,
     get_jmx_pipe_path,
     get_parsed_args,
@@ -127,6 +128,8 @@ class Agent(Daemon):
         log.info("Attempting a configuration reload...")
         hostname = get_hostname(self._agentConfig)
         jmx_sd_configs = None
+        # fetch fresh service discovery configs, the reload may have been triggered by them
+        clear_service_disco_configs()
 
         # if no check was given, reload them all
         if not checks_to_reload:
@@ -4,6 +4,7 @@
 
 # stdlib
 import collections
+import copy
 import locale
 import logging
 import pprint
@@ -35,12 +36,12 @@ import checks.system.unix as u
 import checks.system.win32 as w32
 import modules
 from util import get_uuid
-from utils.cloud_metadata import GCE, EC2, CloudFoundry, Azure
+from utils.cloud_metadata import GCE, EC2, CloudFoundry, Azure, get_metadata_session
 from utils.logger import log_exceptions, RedactedLogRecord
 from utils.jmx import JMXFiles
 from utils.platform import Platform, get_os
 from utils.subprocess_output import get_subprocess_output
-from utils.timer import Timer
+from utils.timer import Timer, monotonic
 from utils.orchestrator import MetadataCollector
 
 logging.LogRecord = RedactedLogRecord
@@ -50,6 +51,15 @@ log = logging.getLogger(__name__)
 FLUSH_LOGGING_PERIOD = 10
 FLUSH_LOGGING_INITIAL = 5
 SD_CHECK_TAG = 'sd_check:{0}'
+# Cloud providers whose metadata endpoint returned nothing aren't probed again
+# before this delay, to avoid paying their HTTP timeout on every payload
+CLOUD_PROVIDER_UNAVAILABLE_TTL = 24 * 60 * 60
+# Failed calls to a cloud provider that already answered are retried with
+# an exponential backoff, then stop being made for a while if they keep failing
+CLOUD_PROVIDER_RETRIES = 2
+CLOUD_PROVIDER_RETRY_BACKOFF = 0.05  # seconds
+CLOUD_PROVIDER_MAX_FAILURES = 3
+CLOUD_PROVIDER_BREAKER_DELAY = 60  # seconds
 
 
 class AgentPayload(collections.MutableMapping):
@@ -170,28 +180,28 @@ class Collector(object):
         self.plugins = None
         self.emitters = emitters
         self.check_timings = agentConfig.get('check_timings')
-        self.push_times = {
-            'host_metadata': {
-                'start': time.time(),
-                'interval': int(agentConfig.get('metadata_interval', 4 * 60 * 60))
-            },
-            'external_host_tags': {
-                'start': time.time() - 3 * 60,  # Wait for the checks to init
-                'interval': int(agentConfig.get('external_host_tags', 5 * 60))
-            },
-            'agent_checks': {
-                'start': time.time(),
-                'interval': int(agentConfig.get('agent_checks_interval', 10 * 60))
-            },
-            'processes': {
-                'start': time.time(),
-                'interval': int(agentConfig.get('processes_interval', 60))
-            }
+        # Start time and interval of each periodic metadata push, on the monotonic clock
+        now = monotonic()
+        self._push_start = {
+            'host_metadata': now,
+            'external_host_tags': now - 3 * 60,  # Wait for the checks to init
+            'agent_checks': now,
+            'processes': now,
+        }
+        self._push_interval = {
+            'host_metadata': int(agentConfig.get('metadata_interval', 4 * 60 * 60)),
+            'external_host_tags': int(agentConfig.get('external_host_tags', 5 * 60)),
+            'agent_checks': int(agentConfig.get('agent_checks_interval', 10 * 60)),
+            'processes': int(agentConfig.get('processes_interval', 60)),
         }
         socket.setdefaulttimeout(15)
         self.run_count = 0
         self.continue_running = True
         self.hostname_metadata_cache = None
+        self._provider_unavailable = {}
+        self._provider_last_data = {}
+        self._provider_failures = {}
+        self._metadata_session = get_metadata_session()
         self.initialized_checks_d = []
         self.init_failed_checks_d = {}
 
@@ -643,6 +653,8 @@ class Collector(object):
         Periodically populate the payload with metadata related to the system, host, and/or checks.
         """
         now = time.time()
+        # Hostname metadata collected during this run
+        hostname_metadata = None
 
         # Include system stats on first postback
         if start_event and self._is_first_run():
@@ -672,7 +684,8 @@ class Collector(object):
                 if host_container_metadata:
                     payload['container-meta'] = host_container_metadata
 
-            payload['meta'] = self._get_hostname_metadata()
+            hostname_metadata = self._get_hostname_metadata()
+            payload['meta'] = hostname_metadata
 
             self.hostname_metadata_cache = payload['meta']
             # Add static tags from the configuration file
@@ -755,13 +768,76 @@ class Collector(object):
                         )
                     )
             payload['agent_checks'] = agent_checks
-            payload['meta'] = self.hostname_metadata_cache  # add hostname metadata
+            # add hostname metadata
+            if self.agentConfig.get('cache_host_metadata', True):
+                payload['meta'] = self.hostname_metadata_cache
+            elif hostname_metadata is not None:
+                # Already collected with the host metadata, don't probe the cloud providers twice
+                payload['meta'] = hostname_metadata
+            else:
+                payload['meta'] = self._get_hostname_metadata()
+
+    def _get_cloud_provider_data(self, provider, getter, retry=False):
+        """
+        Call `getter` with the agent config and the metadata session unless `provider`
+        recently returned nothing, in which case we assume we're not running on it
+        and skip the probe.
+
+        With `retry`, once a provider answered, failures are considered transient: they
+        are retried with an exponential backoff and the last known data is returned if
+        they persist. After CLOUD_PROVIDER_MAX_FAILURES failed calls in a row, the provider
+        isn't probed for CLOUD_PROVIDER_BREAKER_DELAY seconds.
+        `getter` must then return nothing when its endpoint didn't answer, rather than
+        data it cached from a previous call.
+        """
+        now = monotonic()
+        unavailable_until = self._provider_unavailable.get(provider)
+        if unavailable_until is not None and now < unavailable_until:
+            return None
+
+        last_data = self._provider_last_data.get(provider) if retry else None
+        failures, probe_after = self._provider_failures.get(provider, (0, 0))
+        if now < probe_after:
+            return copy.copy(last_data)
+
+        tries = 1 + CLOUD_PROVIDER_RETRIES if last_data else 1
+        for attempt in xrange(tries):
+            if attempt:
+                time.sleep(CLOUD_PROVIDER_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                data = getter(self.agentConfig, session=self._metadata_session)
+            except Exception as e:
+                log.debug("Collecting %s metadata failed: %s", provider, e)
+                data = None
+
+            if data:
+                if retry:
+                    self._provider_last_data[provider] = copy.copy(data)
+                    self._provider_failures.pop(provider, None)
+                self._provider_unavailable.pop(provider, None)
+                return data
+
+        if last_data:
+            failures += 1
+            if failures >= CLOUD_PROVIDER_MAX_FAILURES:
+                log.warning("Collecting %s metadata failed %s times in a row, not probing it again for %ss",
+                            provider, failures, CLOUD_PROVIDER_BREAKER_DELAY)
+                probe_after = monotonic() + CLOUD_PROVIDER_BREAKER_DELAY
+            self._provider_failures[provider] = (failures, probe_after)
+            log.debug("Collecting %s metadata failed, using the last known one", provider)
+            return copy.copy(last_data)
+
+        log.debug("No %s metadata found, not probing it again for %ss",
+                  provider, CLOUD_PROVIDER_UNAVAILABLE_TTL)
+        self._provider_unavailable[provider] = monotonic() + CLOUD_PROVIDER_UNAVAILABLE_TTL
+
+        return data
 
     def _get_hostname_metadata(self):
         """
         Returns a dictionnary that contains hostname metadata.
         """
-        metadata = EC2.get_metadata(self.agentConfig)
+        metadata = self._get_cloud_provider_data('ec2', EC2.get_fresh_metadata, retry=True) or {}
         if metadata.get('hostname'):
             metadata['ec2-hostname'] = metadata.get('hostname')
             del metadata['hostname']
@@ -775,7 +851,8 @@ class Collector(object):
                 pass
 
         try:
-            metadata["socket-fqdn"] = socket.getfqdn()
+            # getfqdn('') resolves gethostname() itself, spare it when we already have it
+            metadata["socket-fqdn"] = socket.getfqdn(metadata.get("socket-hostname", ''))
         except Exception:
             pass
 
@@ -783,33 +860,30 @@ class Collector(object):
         metadata["timezones"] = self._decode_tzname(time.tzname)
 
         # Add cloud provider aliases
-        if not metadata.get("host_aliases"):
-            metadata["host_aliases"] = []
-
-        host_aliases = GCE.get_host_aliases(self.agentConfig)
-        if host_aliases:
-            metadata['host_aliases'] += host_aliases
+        host_aliases = list(metadata.get("host_aliases") or ())
+        # GCE caches its metadata, or its absence, after the first probe
+        host_aliases.extend(GCE.get_host_aliases(self.agentConfig, session=self._metadata_session) or ())
 
         # Try to get Azure VM ID
-        host_aliases = Azure.get_host_aliases(self.agentConfig)
-        if host_aliases:
-            metadata['host_aliases'] += host_aliases
+        host_aliases.extend(self._get_cloud_provider_data('azure', Azure.get_host_aliases, retry=True) or ())
 
         try:
-            metadata["host_aliases"] += CloudFoundry.get_host_aliases(self.agentConfig)
+            host_aliases.extend(CloudFoundry.get_host_aliases(self.agentConfig))
         except Exception:
             pass
 
+        metadata["host_aliases"] = host_aliases
+
         return metadata
 
     def _should_send_additional_data(self, data_name):
         if self._is_first_run():
             return True
         # If the interval has passed, send the metadata again
-        now = time.time()
-        if now - self.push_times[data_name]['start'] >= self.push_times[data_name]['interval']:
+        now = monotonic()
+        if now - self._push_start[data_name] >= self._push_interval[data_name]:
             log.debug('%s interval has passed. Sending it.' % data_name)
-            self.push_times[data_name]['start'] = now
+            self._push_start[data_name] = now
             return True
 
         return False
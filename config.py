@@ -6,40 +6,31 @@
 
 # stdlib
 import ConfigParser
+import copy
 from cStringIO import StringIO
-import glob
 import imp
-import inspect
-import itertools
 import logging
-import logging.config
 import logging.handlers
 from optparse import OptionParser, Values
 import os
+import pkgutil
 import platform
 import re
 from socket import gaierror, gethostbyname
-import string
 import sys
 import traceback
 from importlib import import_module
 
-# 3p
-import simplejson as json
-
 # project
 from util import check_yaml, config_to_yaml
 from utils.platform import Platform, get_os
 from utils.proxy import get_proxy
-from utils.sdk import load_manifest
-from utils.service_discovery.config import extract_agent_config
-from utils.service_discovery.config_stores import CONFIG_FROM_FILE, TRACE_CONFIG
-from utils.service_discovery.sd_backend import get_sd_backend, AUTO_CONFIG_DIR, SD_BACKENDS
+from utils.sdk import read_manifest
 from utils.subprocess_output import (
     get_subprocess_output,
     SubprocessOutputEmptyError,
 )
-from utils.windows_configuration import get_registry_conf, get_windows_sdk_check
+from utils.timer import monotonic
 
 
 # CONSTANTS
@@ -57,6 +48,92 @@ SD_PIPE_WIN_PATH = "\\\\.\\pipe\\{pipename}"
 
 log = logging.getLogger(__name__)
 
+# Directory of the agent's modules, resolved once as it walks the symlinks of the path
+_MODULE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+_AFFIRMATIVE = frozenset(['yes', 'true', '1'])
+
+# Main options of config.cfg converted to booleans/integers, with their default value.
+# Options with a None default are only converted when they're set.
+_BOOL_OPTIONS = [
+    ('allow_ipv6', True),
+    ('apm_enabled', True),
+    ('cache_host_metadata', True),
+    ('check_timings', None),
+    ('collect_ec2_tags', False),
+    ('collect_instance_metadata', True),
+    ('collect_orchestrator_tags', True),
+    ('create_sd_check_tags', False),  # Create app:xxx tags based on monitored apps
+    ('enable_gohai', True),
+    ('exclude_process_args', None),
+    ('gce_updated_hostname', False),
+    ('non_local_traffic', False),  # local traffic only? Default to no
+    ('openstack_use_metadata_tags', True),
+    ('openstack_use_uuid', False),
+    ('process_agent_enabled', False),
+    ('proxy_forbid_method_switch', False),
+    ('skip_ssl_validation', None),
+    ('use_curl_http_client', False),  # there are some issues with the curl client and ELB
+    ('use_mount', None),
+    ('use_sdstatsd', True),
+    ('use_web_info_page', True),  # Concerns only Windows
+    ('utf8_decoding', False),
+]
+
+_INT_OPTIONS = [
+    ('forwarder_timeout', 20),
+    ('graphite_listen_port', None),  # Optional graphite listener
+]
+
+# Histogram percentile, as a decimal number in ]0;1[
+_PERCENTILE_RE = re.compile(r'^0?\.(\d+)$')
+
+# Leading whitespace of the lines of a config file
+_LEADING_WSP_RE = re.compile(r'^[ \t]+', re.MULTILINE)
+
+# Element of an 'X.Y.Z' version string
+_VERSION_ELEM_RE = re.compile(r'\A\d+\Z')
+
+# Patterns of the config compiled so far: {pattern: compiled regex}
+_RE_CACHE = {}
+
+# Result of get_default_bind_host
+_default_bind_host = None
+
+# Parsed config files: {path: ((mtime, size), ConfigParser)}
+_CONFIG_CACHE = {}
+
+# Parsed check configs: {path: ((mtime, size), config)}
+_YAML_CACHE = {}
+
+# Modules of the checks.d checks: {module name: ((path, mtime, size), module)}
+# Keyed by name as `imp.load_source` executes a module again into the same
+# `sys.modules` entry, whatever the path it's loaded from
+_CHECK_MODULES = {}
+
+# `checks.AgentCheck`, imported on first use
+_AGENT_CHECK = None
+
+# Names of the checks installed as wheels: (sys.path, wheels dirs mtimes, expiry, names)
+_WHEEL_CHECKS = None
+
+# Paths of the bundled SSL certificates: {(osname, filename): path}
+_SSL_CERTIFICATES = {}
+
+# Results of get_checks_places: {key: (places, expiry)}
+_CHECKS_PLACES_CACHE = {}
+
+# Service discovery configs: {(backend, config backend): (configs, expiry)}
+_SD_CONFIGS_CACHE = {}
+SD_CONFIGS_TTL = 5.0  # seconds
+
+# Paths added to sys.path by the checks' `pythonpath` option
+_ADDED_PYTHONPATHS = set()
+
+# Results of the config paths probes: {path: (exists, expiry)}
+_PATH_PROBE_CACHE = {}
+PATH_PROBE_TTL = 5.0  # seconds
+
 OLD_STYLE_PARAMETERS = [
     ('apache_status_url', "apache"),
     ('cacti_mysql_server', "cacti"),
@@ -73,11 +150,12 @@ OLD_STYLE_PARAMETERS = [
     ('varnishstat', "varnish"),
     ('WMI', "WMI"),
 ]
+_OLD_STYLE_PREFIXES = tuple(prefix for prefix, _ in OLD_STYLE_PARAMETERS)
 
-NAGIOS_OLD_CONF_KEYS = [
+NAGIOS_OLD_CONF_KEYS = frozenset([
     'nagios_log',
     'nagios_perf_cfg'
-]
+])
 
 
 JMX_SD_CONF_TEMPLATE = '.jmx.{}.yaml'
@@ -131,24 +209,19 @@ def get_version():
 
 def _version_string_to_tuple(version_string):
     '''Return a (X, Y, Z) version tuple from an 'X.Y.Z' version string'''
-    version_list = []
-    for elem in version_string.split('.'):
-        try:
-            elem_int = int(elem)
-        except ValueError:
+    elems = version_string.split('.')
+    for elem in elems:
+        if not _VERSION_ELEM_RE.match(elem):
             log.warning("Unable to parse element '%s' of version string '%s'", elem, version_string)
-            raise
+            raise ValueError("invalid version string: %r" % version_string)
 
-        version_list.append(elem_int)
-
-    return tuple(version_list)
+    return tuple(map(int, elems))
 
 
 # Return url endpoint, here because needs access to version number
 def get_url_endpoint(default_url, endpoint_type='app', cfg_path=None):
     config_path = get_config_path(cfg_path, os_name=get_os())
-    config = ConfigParser.ConfigParser()
-    config.readfp(skip_leading_wsp(open(config_path)))
+    config = _load_raw_config(config_path)
     if config.has_option('Main', 'sd_url') and config.get('Main', 'sd_url'):
         url = config.get('Main', 'sd_url')
     elif config.has_option('Main', 'sd_account') and config.get('Main', 'sd_account'):
@@ -163,7 +236,26 @@ def get_url_endpoint(default_url, endpoint_type='app', cfg_path=None):
 
 def skip_leading_wsp(f):
     "Works on a file, returns a file-like object"
-    return StringIO("\n".join(map(string.strip, f.readlines())))
+    return StringIO(_LEADING_WSP_RE.sub('', f.read()))
+
+
+def _load_raw_config(config_path):
+    """
+    Return the `ConfigParser` of the given config file, only parsing it again
+    when the file changed since the last call.
+    The parser is shared between callers and must not be modified.
+    """
+    st = os.stat(config_path)
+    stamp = (st.st_mtime, st.st_size)
+    cached = _CONFIG_CACHE.get(config_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    config = ConfigParser.ConfigParser()
+    with open(config_path) as f:
+        config.readfp(skip_leading_wsp(f))
+    _CONFIG_CACHE[config_path] = (stamp, config)
+    return config
 
 
 def _windows_commondata_path():
@@ -192,40 +284,64 @@ def _windows_extra_checksd_path():
     return os.path.join(common_data, 'Server Density', 'checks.d')
 
 
-def _windows_checksd_path():
+def _windows_agent_path():
     if hasattr(sys, 'frozen'):
         # we're frozen - from py2exe
         prog_path = os.path.dirname(sys.executable)
-        return _checksd_path(os.path.normpath(os.path.join(prog_path, '..', 'agent')))
+        return os.path.normpath(os.path.join(prog_path, '..', 'agent'))
     else:
-        cur_path = os.path.dirname(__file__)
-        return _checksd_path(cur_path)
+        return os.path.dirname(__file__)
+
+
+def _exists_cached(path, ttl=PATH_PROBE_TTL):
+    """
+    `os.path.exists` for the config paths, whose results are kept for `ttl` seconds
+    as the same paths are probed again and again
+    """
+    now = monotonic()
+    cached = _PATH_PROBE_CACHE.get(path)
+    if cached is not None and now < cached[1]:
+        return cached[0]
+
+    exists = os.path.exists(path)
+    _PATH_PROBE_CACHE[path] = (exists, now + ttl)
+    return exists
 
 
 def _config_path(directory):
     path = os.path.join(directory, SD_CONF)
-    if os.path.exists(path):
+    if _exists_cached(path):
         return path
-    raise PathNotFound(path)
+    return None
 
 
 def _confd_path(directory):
     path = os.path.join(directory, 'conf.d')
-    if os.path.exists(path):
+    if _exists_cached(path):
         return path
-    raise PathNotFound(path)
+    return None
 
 
 def _checksd_path(directory):
     path_override = os.environ.get('CHECKSD_OVERRIDE')
-    if path_override and os.path.exists(path_override):
+    if path_override and _exists_cached(path_override):
         return path_override
 
     # this is deprecated in testing on versions after SDK (5.12.0)
     path = os.path.join(directory, 'checks.d')
-    if os.path.exists(path):
+    if _exists_cached(path):
         return path
-    raise PathNotFound(path)
+    return None
+
+
+def _os_config_dir():
+    "Return the OS-specific directory of the configuration"
+    if Platform.is_windows():
+        return os.path.join(_windows_commondata_path(), 'Server Density')
+    elif Platform.is_mac():
+        return MAC_CONFIG_PATH
+    else:
+        return UNIX_CONFIG_PATH
 
 
 def _is_affirmative(s):
@@ -235,7 +351,22 @@ def _is_affirmative(s):
     if isinstance(s, int):
         return bool(s)
     # try string cast
-    return s.lower() in ('yes', 'true', '1')
+    return s.lower() in _AFFIRMATIVE
+
+
+def _compile(pattern):
+    "Compile `pattern` once per process, as the config may be loaded several times"
+    compiled = _RE_CACHE.get(pattern)
+    if compiled is None:
+        compiled = _RE_CACHE[pattern] = re.compile(pattern)
+    return compiled
+
+
+def _get_int(options, key, default):
+    "Return the integer value of `key` in the `options` dict, or `default` if it's missing"
+    if key in options:
+        return int(options[key])
+    return default
 
 
 def get_config_path(cfg_path=None, os_name=None):
@@ -244,40 +375,33 @@ def get_config_path(cfg_path=None, os_name=None):
         return cfg_path
 
     # Check if there's a config stored in the current agent directory
-    try:
-        path = os.path.realpath(__file__)
-        path = os.path.dirname(path)
-        return _config_path(path)
-    except PathNotFound as e:
-        pass
+    path = _config_path(_MODULE_DIR)
+    if path is not None:
+        return path
 
-    # Check for an OS-specific path, continue on not-found exceptions
-    bad_path = ''
-    try:
-        if Platform.is_windows():
-            common_data = _windows_commondata_path()
-            return _config_path(os.path.join(common_data, 'Server Density'))
-        elif Platform.is_mac():
-            return _config_path(MAC_CONFIG_PATH)
-        else:
-            return _config_path(UNIX_CONFIG_PATH)
-    except PathNotFound as e:
-        if len(e.args) > 0:
-            bad_path = e.args[0]
+    # Check for an OS-specific path
+    directory = _os_config_dir()
+    path = _config_path(directory)
+    if path is not None:
+        return path
 
     # If all searches fail, exit the agent with an error
     sys.stderr.write("Please supply a configuration file at %s or in the directory where "
-                     "the Agent is currently deployed.\n" % bad_path)
+                     "the Agent is currently deployed.\n" % os.path.join(directory, SD_CONF))
     sys.exit(3)
 
 
 def get_default_bind_host():
-    try:
-        gethostbyname('localhost')
-    except gaierror:
-        log.warning("localhost seems undefined in your hosts file, using 127.0.0.1 instead")
-        return '127.0.0.1'
-    return 'localhost'
+    # Resolved once per process, the hosts file isn't expected to change while we run
+    global _default_bind_host
+    if _default_bind_host is None:
+        try:
+            gethostbyname('localhost')
+            _default_bind_host = 'localhost'
+        except gaierror:
+            log.warning("localhost seems undefined in your hosts file, using 127.0.0.1 instead")
+            _default_bind_host = '127.0.0.1'
+    return _default_bind_host
 
 
 def get_histogram_aggregates(configstr=None):
@@ -308,24 +432,18 @@ def get_histogram_percentiles(configstr=None):
         return None
 
     result = []
-    try:
-        vals = configstr.split(',')
-        for val in vals:
-            try:
-                val = val.strip()
-                floatval = float(val)
-                if floatval <= 0 or floatval >= 1:
-                    raise ValueError
-                if len(val) > 4:
-                    log.warning("Histogram percentiles are rounded to 2 digits: {0} rounded"
-                                .format(floatval))
-                result.append(float(val[0:4]))
-            except ValueError:
-                log.warning("Bad histogram percentile value {0}, must be float in ]0;1[, skipping"
-                            .format(val))
-    except Exception:
-        log.exception("Error when parsing histogram percentiles, skipping")
-        return None
+    for val in configstr.split(','):
+        val = val.strip()
+        match = _PERCENTILE_RE.match(val)
+        # Percentiles are truncated to 2 digits, which must not all be 0
+        if match is None or not match.group(1)[:2].strip('0'):
+            log.warning("Bad histogram percentile value {0}, must be float in ]0;1[, skipping"
+                        .format(val))
+            continue
+        if len(match.group(1)) > 2:
+            log.warning("Histogram percentiles are rounded to 2 digits: {0} rounded"
+                        .format(val))
+        result.append(float('0.' + match.group(1)[:2]))
 
     return result
 
@@ -338,7 +456,7 @@ def clean_dd_url(url):
 
 
 def remove_empty(string_array):
-    return filter(lambda x: x, string_array)
+    return filter(None, string_array)
 
 
 def get_config(parse_args=True, cfg_path=None, options=None, can_query_registry=True, allow_invalid_api_key=False):
@@ -373,20 +491,17 @@ def get_config(parse_args=True, cfg_path=None, options=None, can_query_registry=
     # Config handling
     try:
         # Find the right config file
-        path = os.path.realpath(__file__)
-        path = os.path.dirname(path)
-
         config_path = get_config_path(cfg_path, os_name=get_os())
-        config = ConfigParser.ConfigParser()
-        config.readfp(skip_leading_wsp(open(config_path)))
+        config = _load_raw_config(config_path)
+        # Snapshot of the Main section, option names are lowercased by ConfigParser
+        main = dict(config.items('Main'))
 
         # bulk import
-        for option in config.options('Main'):
-            agentConfig[option] = config.get('Main', option)
+        agentConfig.update(main)
 
         # Store developer mode setting in the agentConfig
-        if config.has_option('Main', 'developer_mode'):
-            agentConfig['developer_mode'] = _is_affirmative(config.get('Main', 'developer_mode'))
+        if 'developer_mode' in main:
+            agentConfig['developer_mode'] = _is_affirmative(main['developer_mode'])
 
         # Allow an override with the --profile option
         if options is not None and options.profile:
@@ -394,27 +509,25 @@ def get_config(parse_args=True, cfg_path=None, options=None, can_query_registry=
 
         # Core config
         #ap
-        if not config.has_option('Main', 'agent_key'):
+        if 'agent_key' not in main:
             log.warning(u"No agent key was found. Aborting.")
             sys.exit(2)
 
-        if not (config.has_option('Main', 'sd_url') or config.has_option('Main', 'sd_account')):
+        if not ('sd_url' in main or 'sd_account' in main):
             log.warning(u"No sd_account or sd_url was found. Aborting.")
             sys.exit(2)
         endpoints = {}
         agentConfig['endpoints'] = endpoints
-        if config.has_option('Main', 'sd_account'):
-            agentConfig['sd_account'] = config.get('Main', 'sd_account')
+        if 'sd_account' in main:
+            agentConfig['sd_account'] = main['sd_account']
 
         # Forwarder or not forwarder
         agentConfig['use_forwarder'] = options is not None and options.use_forwarder
         if agentConfig['use_forwarder']:
-            listen_port = 17124
-            if config.has_option('Main', 'listen_port'):
-                listen_port = int(config.get('Main', 'listen_port'))
+            listen_port = _get_int(main, 'listen_port', 17124)
             agentConfig['sd_url'] = "http://" + agentConfig['bind_host'] + ":" + str(listen_port)
-        elif config.has_option('Main', 'sd_url'):
-            agentConfig['sd_url'] = config.get('Main', 'sd_url')
+        elif 'sd_url' in main:
+            agentConfig['sd_url'] = main['sd_url']
         else:
             # Default agent URL
             agentConfig['sd_url'] = "https://" + agentConfig['sd_account'] + ".local"
@@ -422,200 +535,101 @@ def get_config(parse_args=True, cfg_path=None, options=None, can_query_registry=
         if agentConfig['sd_url'].endswith('/'):
             agentConfig['sd_url'] = agentConfig['sd_url'][:-1]
 
-        # Forwarder timeout
-        agentConfig['forwarder_timeout'] = 20
-        if config.has_option('Main', 'forwarder_timeout'):
-            agentConfig['forwarder_timeout'] = int(config.get('Main', 'forwarder_timeout'))
-
-
         # Extra checks.d path
         # the linux directory is set by default
-        if config.has_option('Main', 'additional_checksd'):
-            agentConfig['additional_checksd'] = config.get('Main', 'additional_checksd')
-
-        if config.has_option('Main', 'use_sdstatsd'):
-            agentConfig['use_sdstatsd'] = config.get('Main', 'use_sdstatsd').lower() in ("yes", "true")
-        else:
-            agentConfig['use_sdstatsd'] = True
+        if 'additional_checksd' in main:
+            agentConfig['additional_checksd'] = main['additional_checksd']
 
         # Service discovery
-        if config.has_option('Main', 'service_discovery_backend'):
+        if 'service_discovery_backend' in main:
             try:
+                from utils.service_discovery.config import extract_agent_config
                 additional_config = extract_agent_config(config)
                 agentConfig.update(additional_config)
             except:
                 log.error('Failed to load the agent configuration related to '
                           'service discovery. It will not be used.')
 
-        # Concerns only Windows
-        if config.has_option('Main', 'use_web_info_page'):
-            agentConfig['use_web_info_page'] = config.get('Main', 'use_web_info_page').lower() in ("yes", "true")
-        else:
-            agentConfig['use_web_info_page'] = True
-
         # Which agent key to use
-        agentConfig['agent_key'] = config.get('Main', 'agent_key')
+        agentConfig['agent_key'] = main['agent_key']
 
         agentConfig['endpoints'][agentConfig['sd_url']] = [agentConfig['agent_key']]
 
-        # local traffic only? Default to no
-        agentConfig['non_local_traffic'] = False
-        if config.has_option('Main', 'non_local_traffic'):
-            agentConfig['non_local_traffic'] = config.get('Main', 'non_local_traffic').lower() in ("yes", "true")
-
         # DEPRECATED
-        if config.has_option('Main', 'use_ec2_instance_id'):
-            use_ec2_instance_id = config.get('Main', 'use_ec2_instance_id')
+        if 'use_ec2_instance_id' in main:
             # translate yes into True, the rest into False
-            agentConfig['use_ec2_instance_id'] = (use_ec2_instance_id.lower() == 'yes')
+            agentConfig['use_ec2_instance_id'] = (main['use_ec2_instance_id'].lower() == 'yes')
 
-        if config.has_option('Main', 'check_freq'):
+        if 'check_freq' in main:
             try:
-                agentConfig['check_freq'] = int(config.get('Main', 'check_freq'))
+                agentConfig['check_freq'] = int(main['check_freq'])
             except Exception:
                 pass
 
         # Custom histogram aggregate/percentile metrics
-        if config.has_option('Main', 'histogram_aggregates'):
-            agentConfig['histogram_aggregates'] = get_histogram_aggregates(config.get('Main', 'histogram_aggregates'))
+        if 'histogram_aggregates' in main:
+            agentConfig['histogram_aggregates'] = get_histogram_aggregates(main['histogram_aggregates'])
 
-        if config.has_option('Main', 'histogram_percentiles'):
-            agentConfig['histogram_percentiles'] = get_histogram_percentiles(config.get('Main', 'histogram_percentiles'))
+        if 'histogram_percentiles' in main:
+            agentConfig['histogram_percentiles'] = get_histogram_percentiles(main['histogram_percentiles'])
 
         # Disable Watchdog (optionally)
-        if config.has_option('Main', 'watchdog'):
-            if config.get('Main', 'watchdog').lower() in ('no', 'false'):
+        if 'watchdog' in main:
+            if main['watchdog'].lower() in ('no', 'false'):
                 agentConfig['watchdog'] = False
 
-        # Optional graphite listener
-        if config.has_option('Main', 'graphite_listen_port'):
-            agentConfig['graphite_listen_port'] = \
-                int(config.get('Main', 'graphite_listen_port'))
-        else:
-            agentConfig['graphite_listen_port'] = None
-
         # Sdstatsd config
-        sdstatsd_defaults = {
-            'sdstatsd_port': 8125,
-            'sdstatsd_target': 'http://' + agentConfig['bind_host'] + ':17124',
-        }
-        for key, value in sdstatsd_defaults.iteritems():
-            if config.has_option('Main', key):
-                agentConfig[key] = config.get('Main', key)
-            else:
-                agentConfig[key] = value
-
-        # Create app:xxx tags based on monitored apps
-        agentConfig['create_sd_check_tags'] = config.has_option('Main', 'create_sd_check_tags') and \
-            _is_affirmative(config.get('Main', 'create_sd_check_tags'))
+        agentConfig.update({
+            'sdstatsd_port': main.get('sdstatsd_port', 8125),
+            'sdstatsd_target': main.get('sdstatsd_target', 'http://' + agentConfig['bind_host'] + ':17124'),
+        })
 
         # Forwarding to external statsd server
-        if config.has_option('Main', 'statsd_forward_host'):
-            agentConfig['statsd_forward_host'] = config.get('Main', 'statsd_forward_host')
-            if config.has_option('Main', 'statsd_forward_port'):
-                agentConfig['statsd_forward_port'] = int(config.get('Main', 'statsd_forward_port'))
-
-        # Optional config
-        # FIXME not the prettiest code ever...
-        if config.has_option('Main', 'use_mount'):
-            agentConfig['use_mount'] = _is_affirmative(config.get('Main', 'use_mount'))
+        if 'statsd_forward_host' in main:
+            agentConfig['statsd_forward_host'] = main['statsd_forward_host']
+            if 'statsd_forward_port' in main:
+                agentConfig['statsd_forward_port'] = int(main['statsd_forward_port'])
+
+        # Boolean and integer options
+        typed_options = {}
+        for key, default in _BOOL_OPTIONS:
+            if key in main:
+                typed_options[key] = _is_affirmative(main[key])
+            elif default is not None:
+                typed_options[key] = default
+
+        for key, default in _INT_OPTIONS:
+            if key in main:
+                typed_options[key] = int(main[key])
+            elif default is not None:
+                typed_options[key] = default
+        agentConfig.update(typed_options)
 
         if options is not None and options.autorestart:
             agentConfig['autorestart'] = True
-        elif config.has_option('Main', 'autorestart'):
-            agentConfig['autorestart'] = _is_affirmative(config.get('Main', 'autorestart'))
-
-        if config.has_option('Main', 'check_timings'):
-            agentConfig['check_timings'] = _is_affirmative(config.get('Main', 'check_timings'))
-
-        if config.has_option('Main', 'exclude_process_args'):
-            agentConfig['exclude_process_args'] = _is_affirmative(config.get('Main', 'exclude_process_args'))
+        elif 'autorestart' in main:
+            agentConfig['autorestart'] = _is_affirmative(main['autorestart'])
 
-        try:
-            filter_device_re = config.get('Main', 'device_blacklist_re')
-            agentConfig['device_blacklist_re'] = re.compile(filter_device_re)
-        except ConfigParser.NoOptionError:
-            pass
+        if 'device_blacklist_re' in main:
+            agentConfig['device_blacklist_re'] = _compile(main['device_blacklist_re'])
 
         # Dogstream config
-        if config.has_option("Main", "dogstream_log"):
+        if "dogstream_log" in main:
             # Older version, single log support
-            log_path = config.get("Main", "dogstream_log")
-            if config.has_option("Main", "dogstream_line_parser"):
-                agentConfig["dogstreams"] = ':'.join([log_path, config.get("Main", "dogstream_line_parser")])
+            log_path = main["dogstream_log"]
+            if "dogstream_line_parser" in main:
+                agentConfig["dogstreams"] = ':'.join([log_path, main["dogstream_line_parser"]])
             else:
                 agentConfig["dogstreams"] = log_path
 
-        elif config.has_option("Main", "dogstreams"):
-            agentConfig["dogstreams"] = config.get("Main", "dogstreams")
-
-        if config.has_option("Main", "nagios_perf_cfg"):
-            agentConfig["nagios_perf_cfg"] = config.get("Main", "nagios_perf_cfg")
+        elif "dogstreams" in main:
+            agentConfig["dogstreams"] = main["dogstreams"]
 
-        if config.has_option("Main", "use_curl_http_client"):
-            agentConfig["use_curl_http_client"] = _is_affirmative(config.get("Main", "use_curl_http_client"))
-        else:
-            # Default to False as there are some issues with the curl client and ELB
-            agentConfig["use_curl_http_client"] = False
-
-        if config.has_option("Main", "allow_ipv6"):
-            agentConfig["allow_ipv6"] = _is_affirmative(config.get("Main", "allow_ipv6"))
-        else:
-            agentConfig["allow_ipv6"] = True
+        if "nagios_perf_cfg" in main:
+            agentConfig["nagios_perf_cfg"] = main["nagios_perf_cfg"]
 
         if config.has_section('WMI'):
-            agentConfig['WMI'] = {}
-            for key, value in config.items('WMI'):
-                agentConfig['WMI'][key] = value
-
-        if config.has_option("Main", "skip_ssl_validation"):
-            agentConfig["skip_ssl_validation"] = _is_affirmative(config.get("Main", "skip_ssl_validation"))
-
-        agentConfig["collect_instance_metadata"] = True
-        if config.has_option("Main", "collect_instance_metadata"):
-            agentConfig["collect_instance_metadata"] = _is_affirmative(config.get("Main", "collect_instance_metadata"))
-
-        agentConfig["proxy_forbid_method_switch"] = False
-        if config.has_option("Main", "proxy_forbid_method_switch"):
-            agentConfig["proxy_forbid_method_switch"] = _is_affirmative(config.get("Main", "proxy_forbid_method_switch"))
-
-        agentConfig["collect_ec2_tags"] = False
-        if config.has_option("Main", "collect_ec2_tags"):
-            agentConfig["collect_ec2_tags"] = _is_affirmative(config.get("Main", "collect_ec2_tags"))
-
-        agentConfig["collect_orchestrator_tags"] = True
-        if config.has_option("Main", "collect_orchestrator_tags"):
-            agentConfig["collect_orchestrator_tags"] = _is_affirmative(config.get("Main", "collect_orchestrator_tags"))
-
-        agentConfig["utf8_decoding"] = False
-        if config.has_option("Main", "utf8_decoding"):
-            agentConfig["utf8_decoding"] = _is_affirmative(config.get("Main", "utf8_decoding"))
-
-        agentConfig["gce_updated_hostname"] = False
-        if config.has_option("Main", "gce_updated_hostname"):
-            agentConfig["gce_updated_hostname"] = _is_affirmative(config.get("Main", "gce_updated_hostname"))
-
-        # APM config
-        agentConfig["apm_enabled"] = True
-        if config.has_option("Main", "apm_enabled"):
-            agentConfig["apm_enabled"] = _is_affirmative(config.get("Main", "apm_enabled"))
-
-        agentConfig["process_agent_enabled"] = False
-        if config.has_option("Main", "process_agent_enabled"):
-            agentConfig["process_agent_enabled"] = _is_affirmative(config.get("Main", "process_agent_enabled"))
-
-
-        agentConfig["enable_gohai"] = True
-        if config.has_option("Main", "enable_gohai"):
-            agentConfig["enable_gohai"] = _is_affirmative(config.get("Main", "enable_gohai"))
-
-        agentConfig["openstack_use_uuid"] = False
-        if config.has_option("Main", "openstack_use_uuid"):
-            agentConfig["openstack_use_uuid"] = _is_affirmative(config.get("Main", "openstack_use_uuid"))
-
-        agentConfig["openstack_use_metadata_tags"] = True
-        if config.has_option("Main", "openstack_use_metadata_tags"):
-            agentConfig["openstack_use_metadata_tags"] = _is_affirmative(config.get("Main", "openstack_use_metadata_tags"))
+            agentConfig['WMI'] = dict(config.items('WMI'))
 
     except ConfigParser.NoSectionError as e:
         sys.stderr.write('Config file not found or incorrectly formatted.\n')
@@ -638,6 +652,7 @@ def get_config(parse_args=True, cfg_path=None, options=None, can_query_registry=
     # On Windows, check for api key in registry if default api key
     # this code should never be used and is only a failsafe
     if Platform.is_windows() and agentConfig['api_key'] == 'APIKEYHERE' and can_query_registry:
+        from utils.windows_configuration import get_registry_conf
         registry_conf = get_registry_conf(config)
         agentConfig.update(registry_conf)
 
@@ -659,13 +674,18 @@ def get_system_stats(proc_path=None):
             if not proc_path:
                 proc_path = "/proc"
             proc_cpuinfo = os.path.join(proc_path,'cpuinfo')
-            output, _, _ = get_subprocess_output(['grep', 'model name', proc_cpuinfo], log)
-            systemStats['cpuCores'] = len(output.splitlines())
+            with open(proc_cpuinfo, 'rb') as f:
+                cpu_cores = f.read().count('model name')
+            # Not every kernel lists a model name per core (e.g. ARM)
+            if cpu_cores > 0:
+                systemStats['cpuCores'] = cpu_cores
+            else:
+                log.warning("unable to retrieve number of cpuCores from %s", proc_cpuinfo)
 
         if Platform.is_darwin(platf) or Platform.is_freebsd(platf):
             output, _, _ = get_subprocess_output(['sysctl', 'hw.ncpu'], log)
             systemStats['cpuCores'] = int(output.split(': ')[1])
-    except SubprocessOutputEmptyError as e:
+    except (IOError, SubprocessOutputEmptyError) as e:
         log.warning("unable to retrieve number of cpuCores. Failed with error %s", e)
 
     if Platform.is_linux(platf):
@@ -684,79 +704,74 @@ def get_system_stats(proc_path=None):
     return systemStats
 
 
-def set_win32_cert_path():
-    """In order to use tornado.httpclient with the packaged .exe on Windows we
-    need to override the default ceritifcate location which is based on the path
-    to tornado and will give something like "C:\path\to\program.exe\tornado/cert-file".
+# Only defined on Windows, where they're called
+if Platform.is_windows():
+    def set_win32_cert_path():
+        """In order to use tornado.httpclient with the packaged .exe on Windows we
+        need to override the default ceritifcate location which is based on the path
+        to tornado and will give something like "C:\path\to\program.exe\tornado/cert-file".
 
-    If pull request #379 is accepted (https://github.com/facebook/tornado/pull/379) we
-    will be able to override this in a clean way. For now, we have to monkey patch
-    tornado.httpclient._DEFAULT_CA_CERTS
-    """
-    if hasattr(sys, 'frozen'):
-        # we're frozen - from py2exe
-        prog_path = os.path.dirname(sys.executable)
-        crt_path = os.path.join(prog_path, 'ca-certificates.crt')
-    else:
-        cur_path = os.path.dirname(__file__)
-        crt_path = os.path.join(cur_path, 'packaging', 'sd-agent', 'win32',
-                                'install_files', 'ca-certificates.crt')
-    import tornado.simple_httpclient
-    log.info("Windows certificate path: %s" % crt_path)
-    tornado.simple_httpclient._DEFAULT_CA_CERTS = crt_path
-
-
-def set_win32_requests_ca_bundle_path():
-    """In order to allow `requests` to validate SSL requests with the packaged .exe on Windows,
-    we need to override the default certificate location which is based on the location of the
-    requests or certifi libraries.
-
-    We override the path directly in requests.adapters so that the override works even when the
-    `requests` lib has already been imported
-    """
-    import requests.adapters
-    if hasattr(sys, 'frozen'):
-        # we're frozen - from py2exe
-        prog_path = os.path.dirname(sys.executable)
-        ca_bundle_path = os.path.join(prog_path, 'cacert.pem')
-        requests.adapters.DEFAULT_CA_BUNDLE_PATH = ca_bundle_path
+        If pull request #379 is accepted (https://github.com/facebook/tornado/pull/379) we
+        will be able to override this in a clean way. For now, we have to monkey patch
+        tornado.httpclient._DEFAULT_CA_CERTS
+        """
+        if hasattr(sys, 'frozen'):
+            # we're frozen - from py2exe
+            prog_path = os.path.dirname(sys.executable)
+            crt_path = os.path.join(prog_path, 'ca-certificates.crt')
+        else:
+            cur_path = os.path.dirname(__file__)
+            crt_path = os.path.join(cur_path, 'packaging', 'sd-agent', 'win32',
+                                    'install_files', 'ca-certificates.crt')
+        import tornado.simple_httpclient
+        log.info("Windows certificate path: %s" % crt_path)
+        tornado.simple_httpclient._DEFAULT_CA_CERTS = crt_path
+
+    def set_win32_requests_ca_bundle_path():
+        """In order to allow `requests` to validate SSL requests with the packaged .exe on Windows,
+        we need to override the default certificate location which is based on the location of the
+        requests or certifi libraries.
+
+        We override the path directly in requests.adapters so that the override works even when the
+        `requests` lib has already been imported
+        """
+        import requests.adapters
+        if hasattr(sys, 'frozen'):
+            # we're frozen - from py2exe
+            prog_path = os.path.dirname(sys.executable)
+            ca_bundle_path = os.path.join(prog_path, 'cacert.pem')
+            requests.adapters.DEFAULT_CA_BUNDLE_PATH = ca_bundle_path
 
-    log.info("Default CA bundle path of the requests library: {0}"
-             .format(requests.adapters.DEFAULT_CA_BUNDLE_PATH))
+        log.info("Default CA bundle path of the requests library: {0}"
+                 .format(requests.adapters.DEFAULT_CA_BUNDLE_PATH))
 
 
 def get_confd_path(osname=None):
-    try:
-        cur_path = os.path.dirname(os.path.realpath(__file__))
-        return _confd_path(cur_path)
-    except PathNotFound as e:
-        pass
+    path = _confd_path(_MODULE_DIR)
+    if path is not None:
+        return path
 
-    bad_path = ''
-    try:
-        if Platform.is_windows():
-            common_data = _windows_commondata_path()
-            return _confd_path(os.path.join(common_data, 'Server Density'))
-        elif Platform.is_mac():
-            return _confd_path(MAC_CONFIG_PATH)
-        else:
-            return _confd_path(UNIX_CONFIG_PATH)
-    except PathNotFound as e:
-        if len(e.args) > 0:
-            bad_path = e.args[0]
+    directory = _os_config_dir()
+    path = _confd_path(directory)
+    if path is not None:
+        return path
 
-    raise PathNotFound(bad_path)
+    raise PathNotFound(os.path.join(directory, 'conf.d'))
 
 
 def get_checksd_path(osname=None):
     if Platform.is_windows():
-        return _windows_checksd_path()
+        directory = _windows_agent_path()
     # Mac & Linux
     else:
         # Unix only will look up based on the current directory
         # because checks.d will hang with the other python modules
-        cur_path = os.path.dirname(os.path.realpath(__file__))
-        return _checksd_path(cur_path)
+        directory = _MODULE_DIR
+
+    path = _checksd_path(directory)
+    if path is not None:
+        return path
+    raise PathNotFound(os.path.join(directory, 'checks.d'))
 
 
 def get_sdk_integrations_path(osname=None):
@@ -777,7 +792,7 @@ def get_sdk_integrations_path(osname=None):
             cur_path = os.environ['INTEGRATIONS_DIR']
             path = os.path.join(cur_path, '..') # might need tweaking in the future.
     else:
-        cur_path = os.path.dirname(os.path.realpath(__file__))
+        cur_path = _MODULE_DIR
         path = os.path.join(cur_path, '..', SDK_INTEGRATIONS_DIR)
 
     if os.path.exists(path):
@@ -797,6 +812,7 @@ def get_jmx_pipe_path():
 
 def get_auto_confd_path(osname=None):
     """Used for service discovery which only works for Unix"""
+    from utils.service_discovery.sd_backend import AUTO_CONFIG_DIR
     return os.path.join(get_confd_path(osname), AUTO_CONFIG_DIR)
 
 
@@ -815,7 +831,7 @@ def get_win32service_file(osname, filename):
             return path
 
     else:
-        cur_path = os.path.dirname(os.path.realpath(__file__))
+        cur_path = _MODULE_DIR
         path = os.path.join(cur_path, filename)
         if os.path.exists(path):
             return path
@@ -825,6 +841,14 @@ def get_win32service_file(osname, filename):
 
 def get_ssl_certificate(osname, filename):
     # The SSL certificate is needed by tornado in case of connection through a proxy
+    # It's bundled with the agent, so it's only looked up once per process
+    key = (osname, filename)
+    if key not in _SSL_CERTIFICATES:
+        _SSL_CERTIFICATES[key] = _find_ssl_certificate(osname, filename)
+    return _SSL_CERTIFICATES[key]
+
+
+def _find_ssl_certificate(osname, filename):
     if osname == 'windows':
         if hasattr(sys, 'frozen'):
             # we're frozen - from py2exe
@@ -833,23 +857,85 @@ def get_ssl_certificate(osname, filename):
         else:
             cur_path = os.path.dirname(__file__)
             path = os.path.join(cur_path, filename)
-        if os.path.exists(path):
+        if os.path.isfile(path):
             log.debug("Certificate file found at %s" % str(path))
             return path
     else:
-        cur_path = os.path.dirname(os.path.realpath(__file__))
+        cur_path = _MODULE_DIR
         path = os.path.join(cur_path, filename)
-        if os.path.exists(path):
+        if os.path.isfile(path):
             return path
 
     log.info("Certificate file NOT found at %s" % str(path))
     return None
 
+def _get_agent_check():
+    "Return `checks.AgentCheck`, only importing the checks package once needed"
+    global _AGENT_CHECK
+    if _AGENT_CHECK is None:
+        from checks import AgentCheck
+        _AGENT_CHECK = AgentCheck
+    return _AGENT_CHECK
+
+
+def _get_wheel_checks():
+    """
+    Return the names of the checks installed as wheels, so that the checks that
+    aren't installed don't go through a failed import.
+    The index is built again when `sys.path` changes. The wheels directories are
+    only checked for changes once `PATH_PROBE_TTL` has expired, and not at all
+    when the package isn't installed.
+    """
+    global _WHEEL_CHECKS
+    now = monotonic()
+    if _WHEEL_CHECKS is not None and _WHEEL_CHECKS[0] == sys.path:
+        if not _WHEEL_CHECKS[1] or now < _WHEEL_CHECKS[2]:
+            return _WHEEL_CHECKS[3]
+
+    try:
+        import serverdensity_checks
+        wheels_dirs = list(serverdensity_checks.__path__)
+    except ImportError:
+        wheels_dirs = []
+
+    mtimes = []
+    for path in wheels_dirs:
+        try:
+            mtimes.append((path, os.stat(path).st_mtime))
+        except OSError:
+            mtimes.append((path, None))
+
+    if _WHEEL_CHECKS is not None and _WHEEL_CHECKS[0] == sys.path and _WHEEL_CHECKS[1] == mtimes:
+        names = _WHEEL_CHECKS[3]
+    else:
+        names = frozenset(name for _, name, _ in pkgutil.iter_modules(wheels_dirs))
+    _WHEEL_CHECKS = (list(sys.path), mtimes, now + PATH_PROBE_TTL, names)
+    return names
+
+
+def _load_source_cached(module_name, check_path):
+    """
+    `imp.load_source`, only executing the module again when its source changed
+    since the last call
+    """
+    st = os.stat(check_path)
+    stamp = (check_path, st.st_mtime, st.st_size)
+    cached = _CHECK_MODULES.get(module_name)
+    if cached is not None and cached[0] == stamp and sys.modules.get(module_name) is cached[1]:
+        return cached[1]
+
+    check_module = imp.load_source(module_name, check_path)
+    _CHECK_MODULES[module_name] = (stamp, check_module)
+    return check_module
+
+
 def _get_check_module(check_name, check_path, from_site=False):
     error = None
     traceback_message = None
     if from_site:
         try:
+            if check_name not in _get_wheel_checks():
+                raise ImportError("No module named {}".format(check_name))
             check_module = import_module("serverdensity_checks.{}".format(check_name))
         except Exception as e:
             error = e
@@ -857,7 +943,7 @@ def _get_check_module(check_name, check_path, from_site=False):
             #log.debug('Unable to import check module %s from site-packages: %s', check_name, e)
     else:
         try:
-            check_module = imp.load_source('checksd_%s' % check_name, check_path)
+            check_module = _load_source_cached('checksd_%s' % check_name, check_path)
         except Exception as e:
             error = e
             traceback_message = traceback.format_exc()
@@ -882,7 +968,7 @@ def _get_wheel_version(check_name):
 
 def _get_check_class(check_name, check_path, from_site=False):
     '''Return the corresponding check class for a check name if available.'''
-    from checks import AgentCheck
+    AgentCheck = _get_agent_check()
     check_class = None
 
     check_module, err = _get_check_module(check_name, check_path, from_site)
@@ -890,10 +976,10 @@ def _get_check_class(check_name, check_path, from_site=False):
         return err
 
     # We make sure that there is an AgentCheck class defined
+    # Members are walked in name order, like inspect.getmembers did
     check_class = None
-    classes = inspect.getmembers(check_module, inspect.isclass)
-    for _, clsmember in classes:
-        if clsmember == AgentCheck:
+    for _, clsmember in sorted(vars(check_module).iteritems()):
+        if not isinstance(clsmember, type) or clsmember is AgentCheck:
             continue
         if issubclass(clsmember, AgentCheck):
             check_class = clsmember
@@ -908,7 +994,10 @@ def _deprecated_configs(agentConfig):
     """ Warn about deprecated configs
     """
     deprecated_checks = {}
-    deprecated_configs_enabled = [v for k, v in OLD_STYLE_PARAMETERS if len([l for l in agentConfig if l.startswith(k)]) > 0]
+    # Single pass over the config, then only the matching keys are mapped back to their check
+    old_style_keys = [l for l in agentConfig if l.startswith(_OLD_STYLE_PREFIXES)]
+    deprecated_configs_enabled = [v for k, v in OLD_STYLE_PARAMETERS
+                                  if any(l.startswith(k) for l in old_style_keys)]
     for deprecated_config in deprecated_configs_enabled:
         msg = "Configuring %s in config.cfg is not supported anymore. Please use conf.d" % deprecated_config
         deprecated_checks[deprecated_config] = {'error': msg, 'traceback': None}
@@ -921,12 +1010,25 @@ def _file_configs_paths(osname, agentConfig):
     """
     try:
         confd_path = get_confd_path(osname)
-        all_file_configs = glob.glob(os.path.join(confd_path, '*.yaml'))
-        all_default_configs = glob.glob(os.path.join(confd_path, '*.yaml.default'))
     except PathNotFound as e:
         log.error("No conf.d folder found at '%s' or in the directory where the Agent is currently deployed.\n" % e.args[0])
         sys.exit(3)
 
+    # List conf.d once, skipping hidden files like `glob` does
+    all_file_configs = []
+    all_default_configs = []
+    try:
+        filenames = os.listdir(confd_path)
+    except OSError:
+        filenames = []
+    for filename in filenames:
+        if filename.startswith('.'):
+            continue
+        if filename.endswith('.yaml'):
+            all_file_configs.append(os.path.join(confd_path, filename))
+        elif filename.endswith('.yaml.default'):
+            all_default_configs.append(os.path.join(confd_path, filename))
+
     if all_default_configs:
         current_configs = set([_conf_path_to_check_name(conf) for conf in all_file_configs])
         for default_config in all_default_configs:
@@ -936,9 +1038,9 @@ def _file_configs_paths(osname, agentConfig):
     # Compatibility code for the Nagios checks if it's still configured
     # in config.cfg
     # FIXME: 6.x, should be removed
-    if not any('nagios' in config for config in itertools.chain(*all_file_configs)):
+    if not any('nagios' in config for config in all_file_configs):
         # check if it's configured in config.cfg the old way
-        if any([nagios_key in agentConfig for nagios_key in NAGIOS_OLD_CONF_KEYS]):
+        if not NAGIOS_OLD_CONF_KEYS.isdisjoint(agentConfig):
             all_file_configs.append('deprecated/nagios')
 
     return all_file_configs
@@ -946,47 +1048,87 @@ def _file_configs_paths(osname, agentConfig):
 
 def _service_disco_configs(agentConfig):
     """ Retrieve all the service disco configs and return their conf dicts
+    They're kept for a few seconds, as reloading several checks asks for them once per check.
     """
+    from utils.service_discovery.sd_backend import get_sd_backend, SD_BACKENDS
+
     if agentConfig.get('service_discovery') and agentConfig.get('service_discovery_backend') in SD_BACKENDS:
+        key = (agentConfig['service_discovery_backend'], agentConfig.get('sd_config_backend'))
+        now = monotonic()
+        cached = _SD_CONFIGS_CACHE.get(key)
+        if cached is not None and now < cached[1]:
+            # Callers build check configs around these dicts, they get their own copy
+            return copy.deepcopy(cached[0])
+
         try:
             log.info("Fetching service discovery check configurations.")
             sd_backend = get_sd_backend(agentConfig=agentConfig)
             service_disco_configs = sd_backend.get_configs()
         except Exception:
             log.exception("Loading service discovery configurations failed.")
-            return {}
+            # Don't hit the failing backend again for every check
+            service_disco_configs = {}
+        _SD_CONFIGS_CACHE[key] = (copy.deepcopy(service_disco_configs), now + SD_CONFIGS_TTL)
     else:
         service_disco_configs = {}
 
     return service_disco_configs
 
 
+def clear_service_disco_configs():
+    """ Forget the cached service disco configs, so that a reload fetches them again
+    """
+    _SD_CONFIGS_CACHE.clear()
+
+
 def _conf_path_to_check_name(conf_path):
-    f = os.path.splitext(os.path.split(conf_path)[1])
-    if f[1] and f[1] == ".default":
-        f = os.path.splitext(f[0])
-    return f[0]
+    name = conf_path.rpartition(os.sep)[2]
+    if os.altsep:
+        name = name.rpartition(os.altsep)[2]
+    if name.endswith('.default'):
+        name = name[:-len('.default')]
+    if name.endswith('.yaml'):
+        name = name[:-len('.yaml')]
+    return name
 
 
 def get_checks_places(osname, agentConfig):
     """ Return a list of methods which, when called with a check name, will each return a check path to inspect
+    The places are kept for a few seconds, as service discovery asks for them again on every reload.
     """
+    key = (osname, agentConfig['additional_checksd'], Platform.is_windows(),
+           os.environ.get('CHECKSD_OVERRIDE'), os.environ.get('INTEGRATIONS_DIR'))
+    now = monotonic()
+    cached = _CHECKS_PLACES_CACHE.get(key)
+    if cached is not None and now < cached[1]:
+        return list(cached[0])
+
+    places = _get_checks_places(osname, agentConfig)
+    _CHECKS_PLACES_CACHE[key] = (places, now + PATH_PROBE_TTL)
+    return list(places)
+
+
+def _get_checks_places(osname, agentConfig):
     try:
         checksd_path = get_checksd_path(osname)
     except PathNotFound as e:
         log.info("no bundled checks.d path (checks provided as wheels): %s", e.args[0])
         checksd_path = None
 
+    # The directories are joined once, with a trailing separator, so that
+    # the places only have to concatenate the check name
     # custom checks
-    places = [lambda name: (os.path.join(agentConfig['additional_checksd'], '%s.py' % name), None)]
+    additional_checksd = os.path.join(agentConfig['additional_checksd'], '')
+    places = [lambda name: (additional_checksd + name + '.py', None)]
 
     try:
         if Platform.is_windows():
+            from utils.windows_configuration import get_windows_sdk_check
             places.append(get_windows_sdk_check)
         else:
-            sdk_integrations = get_sdk_integrations_path(osname)
-            places.append(lambda name: (os.path.join(sdk_integrations, name, 'check.py'),
-                                        os.path.join(sdk_integrations, name, 'manifest.json')))
+            sdk_integrations = os.path.join(get_sdk_integrations_path(osname), '')
+            places.append(lambda name: (sdk_integrations + name + os.sep + 'check.py',
+                                        sdk_integrations + name + os.sep + 'manifest.json'))
     except PathNotFound:
         log.debug('No sdk integrations path found')
 
@@ -995,10 +1137,29 @@ def get_checks_places(osname, agentConfig):
 
     # agent-bundled integrations
     if checksd_path:
-        places.append(lambda name: (os.path.join(checksd_path, '%s.py' % name), None))
+        checksd_dir = os.path.join(checksd_path, '')
+        places.append(lambda name: (checksd_dir + name + '.py', None))
     return places
 
 
+def _check_yaml_cached(config_path):
+    """
+    `check_yaml`, only parsing the file again when it changed since the last call.
+    Returns a copy of the config, which checks are free to modify.
+    """
+    try:
+        st = os.stat(config_path)
+    except OSError:
+        _YAML_CACHE.pop(config_path, None)
+        raise
+    stamp = (st.st_mtime, st.st_size)
+
+    cached = _YAML_CACHE.get(config_path)
+    if cached is None or cached[0] != stamp:
+        cached = _YAML_CACHE[config_path] = (stamp, check_yaml(config_path))
+    return copy.deepcopy(cached[1])
+
+
 def _load_file_config(config_path, check_name, agentConfig):
     if config_path == 'deprecated/nagios':
         log.warning("Configuring Nagios in config.cfg is deprecated "
@@ -1008,7 +1169,7 @@ def _load_file_config(config_path, check_name, agentConfig):
         return True, check_config, {}
 
     try:
-        check_config = check_yaml(config_path)
+        check_config = _check_yaml_cached(config_path)
     except Exception as e:
         log.exception("Unable to parse yaml config in %s" % config_path)
         traceback_message = traceback.format_exc()
@@ -1030,7 +1191,7 @@ def get_valid_check_class(check_name, check_path, from_site=False):
 
 
 def _initialize_check(check_config, check_name, check_class, agentConfig,
-                      manifest_path, version_override=None):
+                      manifest_path, version_override=None, manifest=None):
     init_config = check_config.get('init_config') or {}
     instances = check_config['instances']
     try:
@@ -1048,13 +1209,12 @@ def _initialize_check(check_config, check_name, check_class, agentConfig,
             check.set_manifest_path(manifest_path)
 
         if not version_override:
-            check.set_check_version(manifest=load_manifest(manifest_path))
+            check.set_check_version(manifest=manifest)
         else:
             check.set_check_version(version=version_override)
     except Exception as e:
         log.exception('Unable to initialize check %s' % check_name)
         traceback_message = traceback.format_exc()
-        manifest = load_manifest(manifest_path)
         if manifest is not None:
             check_version = '{core}:{vers}'.format(core=AGENT_VERSION,
                                                    vers=manifest.get('version', 'unknown'))
@@ -1074,38 +1234,47 @@ def _update_python_path(check_config):
         pythonpath = check_config['pythonpath']
         if not isinstance(pythonpath, list):
             pythonpath = [pythonpath]
-        sys.path.extend(pythonpath)
+        # Each path is only added once, however many checks use it
+        for path in pythonpath:
+            if path not in _ADDED_PYTHONPATHS:
+                sys.path.append(path)
+                _ADDED_PYTHONPATHS.add(path)
 
 
 def validate_sdk_check(manifest_path):
+    '''Return whether the SDK check's manifest allows the current agent version,
+    and the manifest itself: None if it isn't present, empty if it can't be parsed'''
     max_validated = min_validated = False
     try:
-        with open(manifest_path, 'r') as fp:
-            manifest = json.load(fp)
-            current_version = _version_string_to_tuple(get_version())
-            for maxfield in MANIFEST_VALIDATION['max']:
-                max_version = manifest.get(maxfield)
-                if not max_version:
-                    continue
-
-                max_validated = _version_string_to_tuple(max_version) >= current_version
-                break
-
-            for minfield in MANIFEST_VALIDATION['min']:
-                min_version = manifest.get(minfield)
-                if not min_version:
-                    continue
-
-                min_validated = _version_string_to_tuple(min_version) <= current_version
-                break
-    except IOError:
+        manifest = read_manifest(manifest_path)
+    except (IOError, OSError):
         log.debug("Manifest file (%s) not present." % manifest_path)
-    except json.JSONDecodeError:
+        return False, None
+    except ValueError:
         log.debug("Manifest file (%s) has badly formatted json." % manifest_path)
+        return False, {}
+
+    try:
+        current_version = _version_string_to_tuple(get_version())
+        for maxfield in MANIFEST_VALIDATION['max']:
+            max_version = manifest.get(maxfield)
+            if not max_version:
+                continue
+
+            max_validated = _version_string_to_tuple(max_version) >= current_version
+            break
+
+        for minfield in MANIFEST_VALIDATION['min']:
+            min_version = manifest.get(minfield)
+            if not min_version:
+                continue
+
+            min_validated = _version_string_to_tuple(min_version) <= current_version
+            break
     except ValueError:
         log.debug("Versions in manifest file (%s) can't be validated.", manifest_path)
 
-    return (min_validated and max_validated)
+    return (min_validated and max_validated), manifest
 
 
 def load_check_from_places(check_config, check_name, checks_places, agentConfig):
@@ -1118,7 +1287,7 @@ def load_check_from_places(check_config, check_name, checks_places, agentConfig)
         is_wheel = not check_path and not manifest_path
         # The windows SDK function will return None,
         # so the loop should also continue if there is no path.
-        if not (check_path and os.path.exists(check_path)) and not is_wheel:
+        if not (check_path and os.path.isfile(check_path)) and not is_wheel:
             continue
 
         prev_failures = bool(load_failure)
@@ -1129,8 +1298,9 @@ def load_check_from_places(check_config, check_name, checks_places, agentConfig)
                 load_failure = {}
             continue
 
+        manifest = None
         if manifest_path:
-            validated = validate_sdk_check(manifest_path)
+            validated, manifest = validate_sdk_check(manifest_path)
             if not validated:
                 log.warn("The SDK check (%s) was designed for a different agent core "
                          "or couldnt be validated - behavior is undefined" % check_name)
@@ -1147,7 +1317,7 @@ def load_check_from_places(check_config, check_name, checks_places, agentConfig)
 
 
         load_success, load_failure = _initialize_check(
-            check_config, check_name, check_class, agentConfig, manifest_path, version_override
+            check_config, check_name, check_class, agentConfig, manifest_path, version_override, manifest
         )
 
         _update_python_path(check_config)
@@ -1167,6 +1337,7 @@ def load_check_directory(agentConfig, hostname):
     file in conf.d will be returned. '''
     from checks import AGENT_METRICS_CHECK_NAME
     from jmxfetch import JMX_CHECKS
+    from utils.service_discovery.config_stores import CONFIG_FROM_FILE, TRACE_CONFIG
 
     initialized_checks = {}
     init_failed_checks = {}
@@ -1297,49 +1468,79 @@ def generate_jmx_configs(agentConfig, hostname, checknames=None):
 
 # logging
 
+_LOG_LEVELS = {
+    'CRITICAL': logging.CRITICAL,
+    'DEBUG': logging.DEBUG,
+    'ERROR': logging.ERROR,
+    'FATAL': logging.FATAL,
+    'INFO': logging.INFO,
+    'WARN': logging.WARN,
+    'WARNING': logging.WARNING,
+}
+
+_DEFAULT_LOGGING_CONFIG = {
+    'log_level': None,
+    'log_to_event_viewer': False,
+    'log_to_syslog': False,
+    'syslog_host': None,
+    'syslog_port': None,
+}
+
+_NIX_LOG_FORMAT = '%%(asctime)s | %%(levelname)s | sd.%s | %%(name)s(%%(filename)s:%%(lineno)s) | %%(message)s'
+_WIN_LOG_FORMAT = '%(asctime)s | %(levelname)s | %(name)s(%(filename)s:%(lineno)s) | %(message)s'
+_SYSLOG_FORMAT = 'sd.%s[%%(process)d]: %%(levelname)s (%%(filename)s:%%(lineno)s): %%(message)s'
+
+# Formats of the loggers set up so far: {logger_name: format}
+_LOG_FORMATS = {}
+_SYSLOG_FORMATS = {}
+
+_WINDOWS_LOG_NAMES = ['collector', 'forwarder', 'sdstatsd', 'jmxfetch', 'service']
+
+_UNIX_LOG_FILES = {
+    'collector_log_file': '/var/log/sd-agent/collector.log',
+    'forwarder_log_file': '/var/log/sd-agent/forwarder.log',
+    'sdstatsd_log_file': '/var/log/sd-agent/sdstatsd.log',
+    'jmxfetch_log_file': '/var/log/sd-agent/jmxfetch.log',
+    'go-metro_log_file': '/var/log/sd-agent/go-metro.log',
+    'trace-agent_log_file': '/var/log/sd-agent/trace-agent.log',
+    'process-agent_log_file': '/var/log/sd-agent/process-agent.log',
+}
+
+
 def get_log_date_format():
     return "%Y-%m-%d %H:%M:%S %Z"
 
 
 def get_log_format(logger_name):
     if get_os() != 'windows':
-        return '%%(asctime)s | %%(levelname)s | sd.%s | %%(name)s(%%(filename)s:%%(lineno)s) | %%(message)s' % logger_name
-    return '%(asctime)s | %(levelname)s | %(name)s(%(filename)s:%(lineno)s) | %(message)s'
+        log_format = _LOG_FORMATS.get(logger_name)
+        if log_format is None:
+            log_format = _LOG_FORMATS[logger_name] = _NIX_LOG_FORMAT % logger_name
+        return log_format
+    return _WIN_LOG_FORMAT
 
 
 def get_syslog_format(logger_name):
-    return 'sd.%s[%%(process)d]: %%(levelname)s (%%(filename)s:%%(lineno)s): %%(message)s' % logger_name
+    syslog_format = _SYSLOG_FORMATS.get(logger_name)
+    if syslog_format is None:
+        syslog_format = _SYSLOG_FORMATS[logger_name] = _SYSLOG_FORMAT % logger_name
+    return syslog_format
 
 
 def get_logging_config(cfg_path=None):
     system_os = get_os()
-    logging_config = {
-        'log_level': None,
-        'log_to_event_viewer': False,
-        'log_to_syslog': False,
-        'syslog_host': None,
-        'syslog_port': None,
-    }
+    logging_config = dict(_DEFAULT_LOGGING_CONFIG)
     if system_os == 'windows':
-        logging_config['collector_log_file'] = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs', 'collector.log')
-        logging_config['forwarder_log_file'] = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs', 'forwarder.log')
-        logging_config['sdstatsd_log_file'] = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs', 'sdstatsd.log')
-        logging_config['jmxfetch_log_file'] = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs', 'jmxfetch.log')
-        logging_config['service_log_file'] = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs', 'service.log')
+        logs_dir = os.path.join(_windows_commondata_path(), 'ServerDensity', 'logs')
+        for name in _WINDOWS_LOG_NAMES:
+            logging_config['%s_log_file' % name] = os.path.join(logs_dir, '%s.log' % name)
         logging_config['log_to_syslog'] = False
     else:
-        logging_config['collector_log_file'] = '/var/log/sd-agent/collector.log'
-        logging_config['forwarder_log_file'] = '/var/log/sd-agent/forwarder.log'
-        logging_config['sdstatsd_log_file'] = '/var/log/sd-agent/sdstatsd.log'
-        logging_config['jmxfetch_log_file'] = '/var/log/sd-agent/jmxfetch.log'
-        logging_config['go-metro_log_file'] = '/var/log/sd-agent/go-metro.log'
-        logging_config['trace-agent_log_file'] = '/var/log/sd-agent/trace-agent.log'
-        logging_config['process-agent_log_file'] = '/var/log/sd-agent/process-agent.log'
+        logging_config.update(_UNIX_LOG_FILES)
         logging_config['log_to_syslog'] = True
 
     config_path = get_config_path(cfg_path, os_name=system_os)
-    config = ConfigParser.ConfigParser()
-    config.readfp(skip_leading_wsp(open(config_path)))
+    config = _load_raw_config(config_path)
 
     if config.has_section('handlers') or config.has_section('loggers') or config.has_section('formatters'):
         if system_os == 'windows':
@@ -1352,46 +1553,36 @@ def get_logging_config(cfg_path=None):
              '%s'.
              """ % config_example_file)
 
+    main = dict(config.items('Main')) if config.has_section('Main') else {}
+
     for option in logging_config:
-        if config.has_option('Main', option):
-            logging_config[option] = config.get('Main', option)
-
-    levels = {
-        'CRITICAL': logging.CRITICAL,
-        'DEBUG': logging.DEBUG,
-        'ERROR': logging.ERROR,
-        'FATAL': logging.FATAL,
-        'INFO': logging.INFO,
-        'WARN': logging.WARN,
-        'WARNING': logging.WARNING,
-    }
-    if config.has_option('Main', 'log_level'):
-        logging_config['log_level'] = levels.get(config.get('Main', 'log_level'))
+        if option in main:
+            logging_config[option] = main[option]
+
+    if 'log_level' in main:
+        logging_config['log_level'] = _LOG_LEVELS.get(main['log_level'])
 
-    if config.has_option('Main', 'log_to_syslog'):
-        logging_config['log_to_syslog'] = config.get('Main', 'log_to_syslog').strip().lower() in ['yes', 'true', 1]
+    if 'log_to_syslog' in main:
+        logging_config['log_to_syslog'] = _is_affirmative(main['log_to_syslog'])
 
-    if config.has_option('Main', 'log_to_event_viewer'):
-        logging_config['log_to_event_viewer'] = config.get('Main', 'log_to_event_viewer').strip().lower() in ['yes', 'true', 1]
+    if 'log_to_event_viewer' in main:
+        logging_config['log_to_event_viewer'] = _is_affirmative(main['log_to_event_viewer'])
 
-    if config.has_option('Main', 'syslog_host'):
-        host = config.get('Main', 'syslog_host').strip()
+    if 'syslog_host' in main:
+        host = main['syslog_host'].strip()
         if host:
             logging_config['syslog_host'] = host
         else:
             logging_config['syslog_host'] = None
 
-    if config.has_option('Main', 'syslog_port'):
-        port = config.get('Main', 'syslog_port').strip()
+    if 'syslog_port' in main:
+        port = main['syslog_port'].strip()
         try:
             logging_config['syslog_port'] = int(port)
         except Exception:
             logging_config['syslog_port'] = None
 
-    if config.has_option('Main', 'disable_file_logging'):
-        logging_config['disable_file_logging'] = config.get('Main', 'disable_file_logging').strip().lower() in ['yes', 'true', 1]
-    else:
-        logging_config['disable_file_logging'] = False
+    logging_config['disable_file_logging'] = _is_affirmative(main.get('disable_file_logging'))
 
     return logging_config
 
@@ -0,0 +1,218 @@
+# (C) Datadog, Inc. 2010-2017
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+"""
+Shared fixtures of the JMX integration tests.
+
+`sdstatsd` and `jmxfetch` set up their logging when they're imported, so the
+first import is done with a console-only logging config. Later test modules
+reuse the already loaded modules without patching anything.
+"""
+# stdlib
+from collections import defaultdict
+import logging
+import os
+import Queue
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+# 3p
+import mock
+
+# project
+from aggregator import MetricsAggregator
+from utils.timer import monotonic
+
+LOG_INFO = {
+    'log_to_event_viewer': False,
+    'log_to_syslog': False,
+    'syslog_host': None,
+    'syslog_port': None,
+    'log_level': logging.INFO,
+    'disable_file_logging': True,
+    'collector_log_file': '/var/log/sd-agent/collector.log',
+    'forwarder_log_file': '/var/log/sd-agent/forwarder.log',
+    'sdstatsd_log_file': '/var/log/sd-agent/sdstatsd.log',
+    # JMXFetch logs to its file regardless of `disable_file_logging`
+    'jmxfetch_log_file': os.path.join(tempfile.gettempdir(), 'jmxfetch.log'),
+    'go-metro_log_file': '/var/log/sd-agent/go-metro.log',
+}
+
+if 'sdstatsd' in sys.modules and 'jmxfetch' in sys.modules:
+    from jmxfetch import JMXFetch
+    from sdstatsd import Server
+else:
+    with mock.patch('config.get_logging_config', return_value=LOG_INFO):
+        from jmxfetch import JMXFetch
+        from sdstatsd import Server
+
+# Seconds between two flushes of the aggregator
+FLUSH_INTERVAL = float(os.environ.get('SDAGENT_TEST_FLUSH_INTERVAL', '0.2'))
+
+
+def _pick_port():
+    """
+    Returns a UDP port that's currently free on localhost
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def count_metrics(metrics, tag):
+    """
+    Counts the metrics tagged with `tag` in a single pass, both by full name
+    and by prefix (e.g. `jvm.`), so that any count is then a dict lookup.
+    Each context is only counted once, as the reporter accumulates the metrics
+    of all the JMXFetch runs since the test started.
+    """
+    counts = defaultdict(int)
+    seen = set()
+    for m in metrics:
+        if tag not in m['tags']:
+            continue
+        name = m['metric']
+        context = (name, m['tags'])
+        if context in seen:
+            continue
+        seen.add(context)
+        counts[name] += 1
+        counts[name[:name.find('.') + 1]] += 1
+    return counts
+
+
+def count_contexts(metrics):
+    """
+    Counts the distinct metric contexts, whatever the number of flushes they
+    were accumulated from
+    """
+    return len(set((m['metric'], m['tags']) for m in metrics))
+
+
+def missing_requirements(metrics, tag, required):
+    """
+    Lists the `required` minimum counts, by metric name or prefix, that the
+    metrics tagged with `tag` don't reach yet
+    """
+    counts = count_metrics(metrics, tag)
+    return ['%s (%s/%s)' % (key, counts[key], count)
+            for key, count in sorted(required.iteritems()) if counts[key] < count]
+
+
+class DummyReporter(threading.Thread):
+    def __init__(self, metrics_aggregator):
+        threading.Thread.__init__(self)
+        self.finished = threading.Event()
+        self.metrics_aggregator = metrics_aggregator
+        self.interval = FLUSH_INTERVAL
+        # Batches are accumulated until a test consumes them
+        self._lock = threading.Lock()
+        self.metrics = []
+        # Holds the latest snapshot of the accumulated metrics
+        self.q = Queue.Queue(maxsize=1)
+        self.start()
+
+    def run(self):
+        # Returns early, without a last flush, as soon as the test is done
+        while not self.finished.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            metrics = self.metrics_aggregator.flush()
+            if not metrics:
+                return
+            # Converted once here rather than on every tag lookup of the tests
+            for m in metrics:
+                m['tags'] = frozenset(m['tags'] or ())
+            self.metrics.extend(metrics)
+            # Swapped under the lock so that a reset can't be followed by a stale snapshot
+            try:
+                self.q.get_nowait()
+            except Queue.Empty:
+                pass
+            self.q.put_nowait(list(self.metrics))
+
+    def reset(self):
+        with self._lock:
+            # Drop what the aggregator received but wasn't flushed yet
+            self.metrics_aggregator.flush()
+            self.metrics = []
+            try:
+                self.q.get_nowait()
+            except Queue.Empty:
+                pass
+
+
+class JMXIntegrationTestCase(unittest.TestCase):
+    """
+    Runs a statsd server and JMXFetch, with the yaml configs of `CONFD_PATH`,
+    once for all the tests of the class.
+    """
+    CONFD_PATH = None
+    # A free port is picked when not set
+    STATSD_PORT = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.statsd_port = cls.STATSD_PORT or _pick_port()
+        # Shared by all the tests, the reporter drains it between them
+        cls.aggregator = MetricsAggregator("test_host")
+        cls.server = Server(cls.aggregator, "localhost", cls.statsd_port)
+        cls.reporter = DummyReporter(cls.aggregator)
+
+        cls.t1 = threading.Thread(target=cls.server.start)
+        cls.t1.daemon = True
+        cls.t1.start()
+
+        cls.jmx_daemon = JMXFetch(cls.CONFD_PATH, {'sdstatsd_port': cls.statsd_port})
+        cls.t2 = threading.Thread(target=cls.jmx_daemon.run)
+        cls.t2.daemon = True
+        cls.t2.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            cls.server.stop()
+            cls.reporter.finished.set()
+            cls.reporter.join(timeout=2)
+        finally:
+            # Never leave the JVM behind
+            cls.jmx_daemon.terminate()
+            cls.t2.join(timeout=5)
+
+    def setUp(self):
+        # JMXFetch is only started once per class, only reset what was received
+        self.reporter.reset()
+
+    def wait_for_metrics(self, missing=None, timeout=25):
+        """
+        Returns the metrics accumulated since the test started as soon as
+        `missing(metrics)`, which lists the requirements they don't meet yet,
+        returns nothing. Raises once `timeout` has expired, with what's still
+        missing, so that a timeout isn't reported as a wrong count.
+        """
+        deadline = monotonic() + timeout
+        metrics = None
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                metrics = self.reporter.q.get(timeout=remaining)
+            except Queue.Empty:
+                break
+            if missing is None or not missing(metrics):
+                return metrics
+
+        if metrics is None:
+            raise Exception("No metrics were received in %s seconds" % timeout)
+        raise Exception("Timed out after %s seconds, still missing: %s"
+                        % (timeout, ', '.join(missing(metrics))))
@@ -13,16 +13,25 @@ from nose.plugins.skip import SkipTest
 
 # project
 from config import (
+    clear_service_disco_configs,
     get_config,
+    get_histogram_percentiles,
+    get_system_stats,
     load_check_directory,
     validate_sdk_check,
+    _check_yaml_cached,
     _conf_path_to_check_name,
+    _exists_cached,
+    _load_source_cached,
+    _load_raw_config,
+    _service_disco_configs,
     _version_string_to_tuple,
     ApiKeyInvalid
 )
-from util import windows_friendly_colon_split
+from util import check_yaml, windows_friendly_colon_split
 from utils.hostname import is_valid_hostname
 from utils.pidfile import PidFile
+from utils.sdk import read_manifest
 from utils.platform import Platform
 
 # No more hardcoded default checks
@@ -164,6 +173,148 @@ class TestConfig(unittest.TestCase):
             # cleanup
             Platform.is_win32 = staticmethod(func)
 
+    def test_config_parsed_once(self):
+        """
+        The config file is only parsed again once it has changed
+        """
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, "[Main]\nsd_account: test\n")
+            os.close(fd)
+            config = _load_raw_config(path)
+            self.assertIs(_load_raw_config(path), config)
+
+            with open(path, 'a') as f:
+                f.write("agent_key: 1234\n")
+            config = _load_raw_config(path)
+            self.assertEquals(config.get('Main', 'agent_key'), '1234')
+        finally:
+            os.remove(path)
+
+    def test_check_yaml_cached(self):
+        """
+        Check configs are only parsed again once they have changed, and copied
+        """
+        fd, path = tempfile.mkstemp(suffix='.yaml')
+        try:
+            os.write(fd, "init_config:\ninstances:\n  - host: foo\n")
+            os.close(fd)
+            with mock.patch('config.check_yaml', wraps=check_yaml) as mock_check_yaml:
+                config = _check_yaml_cached(path)
+                config['instances'][0]['host'] = 'bar'
+                self.assertEquals(_check_yaml_cached(path)['instances'], [{'host': 'foo'}])
+                self.assertEquals(mock_check_yaml.call_count, 1)
+
+                with open(path, 'a') as f:
+                    f.write("  - host: baz\n")
+                self.assertEquals(len(_check_yaml_cached(path)['instances']), 2)
+                self.assertEquals(mock_check_yaml.call_count, 2)
+        finally:
+            os.remove(path)
+
+    def test_check_module_loaded_once(self):
+        """
+        checks.d modules are only executed again once their source has changed
+        """
+        fd, path = tempfile.mkstemp(suffix='.py')
+        try:
+            os.write(fd, "VALUE = 1\n")
+            os.close(fd)
+            module = _load_source_cached('checksd_test', path)
+            self.assertIs(_load_source_cached('checksd_test', path), module)
+
+            with open(path, 'w') as f:
+                f.write("VALUE = 22\n")
+            self.assertEquals(_load_source_cached('checksd_test', path).VALUE, 22)
+        finally:
+            os.remove(path)
+            if os.path.exists(path + 'c'):
+                os.remove(path + 'c')
+
+    def test_check_module_from_another_path(self):
+        """
+        A check module loaded from another path is executed again, and isn't
+        returned for the previous path
+        """
+        paths = []
+        try:
+            for value in (1, 2):
+                fd, path = tempfile.mkstemp(suffix='.py')
+                os.write(fd, "VALUE = %s\n" % value)
+                os.close(fd)
+                paths.append(path)
+
+            self.assertEquals(_load_source_cached('checksd_test', paths[0]).VALUE, 1)
+            self.assertEquals(_load_source_cached('checksd_test', paths[1]).VALUE, 2)
+            self.assertEquals(_load_source_cached('checksd_test', paths[0]).VALUE, 1)
+        finally:
+            for path in paths:
+                os.remove(path)
+                if os.path.exists(path + 'c'):
+                    os.remove(path + 'c')
+
+    @mock.patch('config.monotonic')
+    def test_path_probes_cached(self, mock_monotonic):
+        """
+        Path probes are only done again once their result has expired
+        """
+        path = tempfile.mkdtemp()
+        mock_monotonic.return_value = 0
+        self.assertTrue(_exists_cached(path))
+        os.rmdir(path)
+        self.assertTrue(_exists_cached(path))
+
+        mock_monotonic.return_value = 10
+        self.assertFalse(_exists_cached(path))
+
+    @mock.patch('config.monotonic', return_value=0)
+    @mock.patch('utils.service_discovery.sd_backend.get_sd_backend')
+    def test_service_disco_configs_cached(self, mock_get_sd_backend, mock_monotonic):
+        """
+        Service discovery configs are fetched once per TTL, failures included,
+        and every caller gets its own copy
+        """
+        agentConfig = {'service_discovery': True, 'service_discovery_backend': 'docker'}
+        get_configs = mock_get_sd_backend.return_value.get_configs
+        get_configs.return_value = {'redis': ('docker', ({}, [{'host': 'foo'}]))}
+        clear_service_disco_configs()
+        try:
+            configs = _service_disco_configs(agentConfig)
+            configs['redis'][1][1][0]['host'] = 'bar'
+            self.assertEquals(_service_disco_configs(agentConfig)['redis'][1][1], [{'host': 'foo'}])
+            self.assertEquals(get_configs.call_count, 1)
+
+            clear_service_disco_configs()
+            get_configs.side_effect = Exception("backend down")
+            self.assertEquals(_service_disco_configs(agentConfig), {})
+            self.assertEquals(_service_disco_configs(agentConfig), {})
+            self.assertEquals(get_configs.call_count, 2)
+        finally:
+            clear_service_disco_configs()
+
+    @mock.patch('utils.platform.Platform.is_linux', return_value=True)
+    def test_cpu_cores(self, mock_is_linux):
+        """
+        CPU cores are counted from the proc cpuinfo, and left unset when it has no model names
+        """
+        proc_path = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(proc_path, 'cpuinfo'), 'w') as f:
+                f.write("processor\t: 0\nmodel name\t: foo\n\nprocessor\t: 1\nmodel name\t: foo\n")
+            self.assertEquals(get_system_stats(proc_path=proc_path)['cpuCores'], 2)
+
+            with open(os.path.join(proc_path, 'cpuinfo'), 'w') as f:
+                f.write("processor\t: 0\nBogoMIPS\t: 100.00\nCPU architecture: 8\n")
+            self.assertNotIn('cpuCores', get_system_stats(proc_path=proc_path))
+        finally:
+            rmtree(proc_path)
+
+    def test_histogram_percentiles(self):
+        self.assertEquals(get_histogram_percentiles('0.95, .5,0.995'), [0.95, 0.5, 0.99])
+        # Invalid values are skipped
+        self.assertEquals(get_histogram_percentiles('0.75, 1, abc, 0.001, 1.5'), [0.75])
+        self.assertIsNone(get_histogram_percentiles(None))
+
     def testDefaultChecks(self):
         checks = load_check_directory({"additional_checksd": "/etc/dd-agent/checks.d/"}, "foo")
         init_checks_names = [c.name for c in checks['initialized_checks']]
@@ -184,7 +335,7 @@ FIXTURE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtur
 @mock.patch('config.get_checksd_path', return_value=TEMP_AGENT_CHECK_DIR)
 @mock.patch('config.get_confd_path', return_value=TEMP_ETC_CONF_DIR)
 @mock.patch('config.get_sdk_integrations_path', return_value=TEMP_SDK_INTEGRATIONS_CHECKS_DIR)
-@mock.patch('config.get_windows_sdk_check',
+@mock.patch('utils.windows_configuration.get_windows_sdk_check',
             return_value=(os.path.join(TEMP_SDK_INTEGRATIONS_CHECKS_DIR, 'test_check', 'check.py'), None))
 class TestConfigLoadCheckDirectory(unittest.TestCase):
 
@@ -217,14 +368,20 @@ class TestConfigLoadCheckDirectory(unittest.TestCase):
         check_name = u"haproxy"
         unix_check_path = u"/etc/dd-agent/conf.d/haproxy.yaml"
         win_check_path = u"C:\\ProgramData\\Datadog\\conf.d\\haproxy.yaml"
-        with mock.patch('config.os.path.splitext', side_effect=ntpath.splitext):
-            with mock.patch('config.os.path.split', side_effect=ntpath.split):
+        with mock.patch('config.os.sep', ntpath.sep):
+            with mock.patch('config.os.altsep', ntpath.altsep):
                 self.assertEquals(
                     _conf_path_to_check_name(win_check_path), check_name
                 )
+                self.assertEquals(
+                    _conf_path_to_check_name(win_check_path + '.default'), check_name
+                )
         self.assertEquals(
             _conf_path_to_check_name(unix_check_path), check_name
         )
+        self.assertEquals(
+            _conf_path_to_check_name(unix_check_path + '.default'), check_name
+        )
 
     def testConfigNotFound(self, *args):
         copyfile('%s/valid_conf.yaml' % FIXTURE_PATH,
@@ -346,21 +503,25 @@ class TestManifestValidation(unittest.TestCase):
     @mock.patch('config.get_version', return_value='5.12.0')
     def testManifestValidateOK(self, *args):
         manifest_path = '{}/manifest.json'.format(FIXTURE_PATH)
-        validate = validate_sdk_check(manifest_path)
+        validate, _ = validate_sdk_check(manifest_path)
         self.assertEquals(True, validate)
 
     @mock.patch('config.get_version', return_value='4.0.1')
     def testManifestValidateNOKHigh(self, *args):
         manifest_path = '{}/manifest.json'.format(FIXTURE_PATH)
-        validate = validate_sdk_check(manifest_path)
+        validate, _ = validate_sdk_check(manifest_path)
         self.assertEquals(False, validate)
 
     @mock.patch('config.get_version', return_value='6.0.1')
     def testManifestValidateNOKLow(self, *args):
         manifest_path = '{}/manifest.json'.format(FIXTURE_PATH)
-        validate = validate_sdk_check(manifest_path)
+        validate, _ = validate_sdk_check(manifest_path)
         self.assertEquals(False, validate)
 
+    def testManifestParsedOnce(self, *args):
+        manifest_path = '{}/manifest.json'.format(FIXTURE_PATH)
+        self.assertIs(read_manifest(manifest_path), read_manifest(manifest_path))
+
     def testVersionStringToTupleBadVersion(self, *args):
         with self.assertRaises(ValueError):
             _version_string_to_tuple('5.10.4a')
@@ -3,6 +3,7 @@ import time
 import types
 
 # 3p
+import mock
 import unittest
 
 # project
@@ -30,3 +31,24 @@ class TestEC2(unittest.TestCase):
             self.assertTrue(EC2.is_default(hostname))
         for hostname in ['i-672d49da', 'localhost', 'robert.redf.org']:
             self.assertFalse(EC2.is_default(hostname))
+
+    def test_fresh_metadata(self):
+        """
+        The fresh metadata is empty when the metadata endpoint doesn't answer,
+        even though metadata was collected before
+        """
+        EC2.metadata = {'instance-id': 'i-deadbeef'}
+        EC2.is_openstack = False
+        session = mock.Mock()
+        session.get.side_effect = Exception("timeout")
+        agentConfig = {'collect_instance_metadata': True}
+        try:
+            self.assertEquals(EC2.get_metadata(agentConfig, session=session), {'instance-id': 'i-deadbeef'})
+            self.assertEquals(EC2.get_fresh_metadata(agentConfig, session=session), {})
+
+            session.get.side_effect = None
+            session.get.return_value.content = 'i-cafebabe'
+            self.assertEquals(EC2.get_fresh_metadata(agentConfig, session=session)['instance-id'], 'i-cafebabe')
+        finally:
+            EC2.metadata = {}
+            EC2.is_openstack = None
@@ -4,7 +4,7 @@ import unittest
 
 # project
 from checks import AgentCheck
-from checks.collector import Collector
+from checks.collector import AgentPayload, Collector
 
 
 class TestMetadata(unittest.TestCase):
@@ -34,6 +34,73 @@ class TestMetadata(unittest.TestCase):
         assert "socket-fqdn" in metadata
         assert "socket-hostname" in metadata
 
+    def test_unavailable_cloud_provider_not_probed_again(self):
+        """
+        Cloud providers returning no metadata are skipped on the next payloads
+        """
+        c = Collector({"collect_instance_metadata": True}, None, {}, "foo")
+        getter = mock.Mock(return_value=[])
+
+        self.assertFalse(c._get_cloud_provider_data('azure', getter))
+        self.assertFalse(c._get_cloud_provider_data('azure', getter))
+        self.assertEquals(getter.call_count, 1)
+
+        # Once the delay has expired, the provider is probed again
+        c._provider_unavailable['azure'] = 0
+        getter.return_value = ['foo.bar']
+        self.assertEquals(c._get_cloud_provider_data('azure', getter), ['foo.bar'])
+        self.assertEquals(c._get_cloud_provider_data('azure', getter), ['foo.bar'])
+        self.assertEquals(getter.call_count, 3)
+
+    @mock.patch('time.sleep')
+    def test_cloud_provider_failures(self, mock_sleep):
+        """
+        Failures of a cloud provider that answered before are retried, then
+        the last known data is used and the provider isn't probed for a while
+        """
+        c = Collector({"collect_instance_metadata": True}, None, {}, "foo")
+        getter = mock.Mock(return_value=['deadbeef'])
+        self.assertEquals(c._get_cloud_provider_data('azure', getter, retry=True), ['deadbeef'])
+
+        getter.return_value = []
+        for _ in range(3):
+            self.assertEquals(c._get_cloud_provider_data('azure', getter, retry=True), ['deadbeef'])
+        self.assertEquals(getter.call_count, 1 + 3 * 3)
+        self.assertEquals(mock_sleep.call_args_list, [mock.call(0.05), mock.call(0.1)] * 3)
+
+        # The breaker is open: the last known data is returned without probing
+        self.assertEquals(c._get_cloud_provider_data('azure', getter, retry=True), ['deadbeef'])
+        self.assertEquals(getter.call_count, 10)
+
+        # A success closes it
+        c._provider_failures['azure'] = (3, 0)
+        getter.return_value = ['cafebabe']
+        self.assertEquals(c._get_cloud_provider_data('azure', getter, retry=True), ['cafebabe'])
+        self.assertNotIn('azure', c._provider_failures)
+
+    @mock.patch('checks.collector.GCE.get_tags', return_value=None)
+    @mock.patch('checks.collector.get_system_stats', return_value={})
+    def test_hostname_metadata_collected_once_per_run(self, *mocks):
+        """
+        Without cache_host_metadata, the host metadata and the agent checks
+        sent in the same run share the hostname metadata
+        """
+        agentConfig = {
+            'collect_instance_metadata': True, 'cache_host_metadata': False,
+            'collect_orchestrator_tags': False, 'tags': None, 'collect_ec2_tags': False,
+            'create_sd_check_tags': False,
+        }
+        c = Collector(agentConfig, None, {}, "foo")
+        c._run_gohai_metadata = mock.Mock(return_value=None)
+        c._get_hostname_metadata = mock.Mock(return_value={'hostname': 'foo'})
+        payload = AgentPayload()
+        payload['host-tags'] = {}
+        c._populate_payload_metadata(payload, [], start_event=False)
+
+        self.assertEquals(payload['meta'], {'hostname': 'foo'})
+        self.assertEquals(payload['agent_checks'], [])
+        self.assertEquals(c._get_hostname_metadata.call_count, 1)
+
     def test_instance_metadata_rollup(self):
         """
         Roll-up instance metadata
@@ -105,8 +105,9 @@ class NoInstancesFound(Exception):
     pass
 
 def check_yaml(conf_path):
-    with open(conf_path) as f:
-        check_config = yaml.load(f.read(), Loader=yLoader)
+    # Binary mode: the loader decodes the stream itself, reading it in chunks
+    with open(conf_path, 'rb') as f:
+        check_config = yaml.load(f, Loader=yLoader)
         assert 'init_config' in check_config, "No 'init_config' section found"
         assert 'instances' in check_config, "No 'instances' section found"
 
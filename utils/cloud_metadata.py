@@ -10,24 +10,38 @@ import socket
 
 # 3rd party
 import requests
+from requests.adapters import HTTPAdapter
 
 # project
 from utils.proxy import get_proxy
 
 log = logging.getLogger(__name__)
 
+
+def get_metadata_session():
+    """
+    Return a `requests.Session` keeping its connections to the metadata
+    endpoints alive, to be passed to the cloud providers' helpers.
+    Failed probes aren't retried here, the collector already retries them.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0)
+    session.mount('http://', adapter)
+    return session
+
+
 class Azure(object):
     URL = "http://169.254.169.254/metadata/instance?api-version=2017-04-02"
     TIMEOUT = 0.3 # second
 
     @staticmethod
-    def _get_metadata(agentConfig):
+    def _get_metadata(agentConfig, session=None):
         if not agentConfig.get('collect_instance_metadata', True):
             log.info("Instance metadata collection is disabled: not collecting Azure metadata.")
             return {}
 
         try:
-            r = requests.get(
+            r = (session or requests).get(
                 Azure.URL,
                 timeout=Azure.TIMEOUT,
                 headers={'Metadata': 'true'}
@@ -39,9 +53,9 @@ class Azure(object):
             return None
 
     @staticmethod
-    def get_host_aliases(agentConfig):
+    def get_host_aliases(agentConfig, session=None):
         try:
-            host_metadata = Azure._get_metadata(agentConfig)
+            host_metadata = Azure._get_metadata(agentConfig, session)
             return [host_metadata['compute']['vmId']]
         except Exception:
             return []
@@ -56,7 +70,7 @@ class GCE(object):
 
 
     @staticmethod
-    def _get_metadata(agentConfig):
+    def _get_metadata(agentConfig, session=None):
         if GCE.metadata is not None:
             return GCE.metadata.copy()
 
@@ -66,7 +80,7 @@ class GCE(object):
             return {}
 
         try:
-            r = requests.get(
+            r = (session or requests).get(
                 GCE.URL,
                 timeout=GCE.TIMEOUT,
                 headers={'Metadata-Flavor': 'Google'}
@@ -123,9 +137,9 @@ class GCE(object):
             return None
 
     @staticmethod
-    def get_host_aliases(agentConfig):
+    def get_host_aliases(agentConfig, session=None):
         try:
-            host_metadata = GCE._get_metadata(agentConfig)
+            host_metadata = GCE._get_metadata(agentConfig, session)
             project_id = host_metadata['project']['projectId']
             instance_name = host_metadata['instance']['hostname'].split('.')[0]
             return ['%s.%s' % (instance_name, project_id)]
@@ -143,6 +157,8 @@ class EC2(object):
     DEFAULT_PREFIXES = [u'ip-', u'domu']
     metadata = {}
     is_openstack = None
+    # Whether the last `get_metadata` call got any answer from the metadata endpoint
+    last_fetch_succeeded = False
 
     class NoIAMRole(Exception):
         """
@@ -243,8 +259,9 @@ class EC2(object):
         return EC2_tags
 
     @staticmethod
-    def get_metadata(agentConfig):
+    def get_metadata(agentConfig, session=None):
         """Use the ec2 http service to introspect the instance. This adds latency if not running on EC2
+        `session` is an optional `requests.Session` to reuse connections to the metadata endpoint
         """
         # >>> import requests
         # >>> requests.get('http://169.254.169.254/latest/', timeout=1).content
@@ -254,18 +271,21 @@ class EC2(object):
         # >>> requests.get('http://169.254.169.254/latest/meta-data/instance-id', timeout=1).content
         # 'i-deadbeef'
 
+        EC2.last_fetch_succeeded = False
         if not agentConfig['collect_instance_metadata']:
             log.info("Instance metadata collection is disabled. Not collecting it.")
             return {}
 
+        http = session or requests
         for k in ('instance-id', 'hostname', 'local-hostname', 'public-hostname', 'ami-id', 'local-ipv4', 'public-keys/', 'public-ipv4', 'reservation-id', 'security-groups'):
             try:
                 url = EC2.METADATA_URL_BASE + "/" + unicode(k)
-                r = requests.get(url, timeout=EC2.TIMEOUT)
+                r = http.get(url, timeout=EC2.TIMEOUT)
                 r.raise_for_status()
                 v = r.content.strip()
                 assert type(v) in (types.StringType, types.UnicodeType) and len(v) > 0, "%s is not a string" % v
                 EC2.metadata[k.rstrip('/')] = v
+                EC2.last_fetch_succeeded = True
             except Exception as e:
                 log.debug("Collecting EC2 Metadata failed %s", str(e))
                 pass
@@ -275,10 +295,11 @@ class EC2(object):
             log.info(u"Attempting to get OpenStack meta_data.json")
             openstack_metadata_url = EC2.EC2_METADATA_HOST + "/openstack/latest/meta_data.json"
             try:
-                r = requests.get(openstack_metadata_url, timeout=EC2.TIMEOUT)
+                r = http.get(openstack_metadata_url, timeout=EC2.TIMEOUT)
                 r.raise_for_status() # Fail on 404 etc
 
                 EC2.is_openstack = True
+                EC2.last_fetch_succeeded = True
                 openstack_metadata = r.json()
                 # Set the "also known as" metadata similar to AWS EC2
                 EC2.metadata['host_aliases'] = [
@@ -297,6 +318,14 @@ class EC2(object):
 
         return EC2.metadata.copy()
 
+    @staticmethod
+    def get_fresh_metadata(agentConfig, session=None):
+        """Like `get_metadata`, but returns nothing when the metadata endpoint didn't answer,
+        rather than the metadata collected by the previous calls
+        """
+        metadata = EC2.get_metadata(agentConfig, session=session)
+        return metadata if EC2.last_fetch_succeeded else {}
+
     @staticmethod
     def get_instance_id(agentConfig):
         try:
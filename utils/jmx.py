@@ -13,7 +13,7 @@ import yaml
 
 # agent
 from config import _windows_commondata_path, get_confd_path, JMX_VERSION
-from util import yDumper
+from util import yDumper, yLoader
 from utils.pidfile import PidFile
 from utils.platform import Platform
 
@@ -146,6 +146,6 @@ class JMXFiles(object):
         check_names = []
         jmx_status_path = os.path.join(cls._get_dir(), cls._STATUS_FILE)
         if os.path.exists(jmx_status_path):
-            jmx_checks = yaml.safe_load(file(jmx_status_path)).get('checks', {})
+            jmx_checks = yaml.load(file(jmx_status_path), Loader=yLoader).get('checks', {})
             check_names = [name for name in jmx_checks.get('initialized_checks', {}).iterkeys()]
         return check_names
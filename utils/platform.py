@@ -7,20 +7,31 @@ import os
 import sys
 
 
+# Results of get_os: {sys.platform: OS name}
+_OS_NAMES = {}
+
+
 def get_os():
     "Human-friendly OS name"
-    if sys.platform == 'darwin':
+    os_name = _OS_NAMES.get(sys.platform)
+    if os_name is None:
+        os_name = _OS_NAMES[sys.platform] = _get_os_name(sys.platform)
+    return os_name
+
+
+def _get_os_name(platform):
+    if platform == 'darwin':
         return 'mac'
-    elif sys.platform.find('freebsd') != -1:
+    elif platform.find('freebsd') != -1:
         return 'freebsd'
-    elif sys.platform.find('linux') != -1:
+    elif platform.find('linux') != -1:
         return 'linux'
-    elif sys.platform.find('win32') != -1:
+    elif platform.find('win32') != -1:
         return 'windows'
-    elif sys.platform.find('sunos') != -1:
+    elif platform.find('sunos') != -1:
         return 'solaris'
     else:
-        return sys.platform
+        return platform
 
 
 class Platform(object):
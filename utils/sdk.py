@@ -3,7 +3,6 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 # stdlib
-import logging
 import os
 
 # 3p
@@ -12,17 +11,24 @@ import simplejson as json
 # project
 
 
-log = logging.getLogger(__name__)
+# Parsed manifests: {path: ((mtime, size), manifest)}
+_MANIFESTS = {}
 
 
-def load_manifest(path):
-    manifest = None
-    try:
-        if path and os.path.exists(path):
-            with open(path) as fp:
-                manifest = json.load(fp)
-    except (IOError, json.JSONDecodeError) as e:
-        log.warn("Unable to read manifest at %s : %s", path, e)
-        manifest = {}
+def read_manifest(path):
+    """
+    Return the parsed manifest at `path`, only parsing it again when the file
+    changed since the last call. The manifest is shared and must not be modified.
+    Raises `IOError`/`OSError` when the file can't be read, `ValueError` when
+    it isn't valid JSON.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime, st.st_size)
+    cached = _MANIFESTS.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
 
+    with open(path) as fp:
+        manifest = json.load(fp)
+    _MANIFESTS[path] = (stamp, manifest)
     return manifest
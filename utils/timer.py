@@ -3,6 +3,8 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 # stdlib
+import os
+import sys
 import time
 
 class Timer(object):
@@ -27,3 +29,43 @@ class Timer(object):
 
     def total(self, as_sec=True):
         return self._now() - self.started
+
+
+def _get_monotonic():
+    try:
+        from time import monotonic
+        return monotonic
+    except ImportError:
+        pass
+
+    # Python 2 has no monotonic clock, read CLOCK_MONOTONIC from the libc on Linux
+    if sys.platform.startswith('linux'):
+        try:
+            import ctypes
+            import ctypes.util
+
+            class timespec(ctypes.Structure):
+                _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+            CLOCK_MONOTONIC = 1
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            clock_gettime = libc.clock_gettime
+            clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+            def monotonic():
+                t = timespec()
+                if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, os.strerror(errno))
+                return t.tv_sec + t.tv_nsec * 1e-9
+
+            monotonic()
+            return monotonic
+        except Exception:
+            pass
+
+    return time.time
+
+# Clock unaffected by system time updates, to measure intervals
+# Falls back on `time.time` on platforms where none is available
+monotonic = _get_monotonic()